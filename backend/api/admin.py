@@ -1,24 +1,97 @@
 from django.contrib import admin
+from django.db import transaction
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.admin.utils import unquote
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.http import Http404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
 from django.utils import timezone
 from django.utils.html import format_html
-from django.template.loader import render_to_string
-from django.core.mail import EmailMultiAlternatives
-from django.utils.html import strip_tags
 from datetime import timedelta
-from django.utils.safestring import mark_safe
 
-from .models import Vault, Letter, Executor
+from .models import Vault, VaultItem, Letter, Executor, OutboundEmail
+from . import documents, emails
+from .routers import read_from_replica
 
 User = get_user_model()
 
+# Below this many rows an exact COUNT(*) is cheap enough to keep
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses Postgres' planner estimate instead of COUNT(*) for unfiltered changelists
+    on big tables. Page links may be slightly off; filtered lists still count exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where and connections[queryset.db].vendor == 'postgresql':
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            # reltuples is -1 (or 0) until the table has been analyzed
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class ReplicaChangelistMixin:
+    """
+    Changelist pages read from a replica when one is configured (see routers.py).
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        @read_from_replica
+        def view(request):
+            response = super(ReplicaChangelistMixin, self).changelist_view(request, extra_context)
+            # The result list is only fetched while rendering, which has to happen on the replica too
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+        return view(request)
+
+
+class LargeTableAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    """
+    Changelist settings for tables that grow with the user base: related rows come
+    in the same query, `list_defer` columns are skipped, and counts are estimated.
+    """
+    list_select_related = ('user',)
+    # Columns never shown in the list, left unloaded there (the change form still gets them)
+    list_defer = ()
+    paginator = EstimatedCountPaginator
+    # Otherwise every search also counts the whole table for "N total"
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if self.list_defer and match and match.url_name == f"{self.opts.app_label}_{self.opts.model_name}_changelist":
+            queryset = queryset.defer(*self.list_defer)
+        return queryset
+
 # --- Custom User Admin ---
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(ReplicaChangelistMixin, UserAdmin):
     list_display = ('email', 'full_name', 'is_staff', 'is_active', 'check_in_status', 'date_joined')
-    search_fields = ('email', 'full_name')
+    # '=' and '^' searches are served by the UPPER() indexes, a plain contains search scans the table.
+    # So emails match whole (case-insensitive) and names by prefix, see search_help_text / README
+    search_fields = ('=email', '^full_name')
+    search_help_text = "Full email address, or the start of the name."
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     ordering = ('-date_joined',)
     
@@ -27,6 +100,7 @@ class CustomUserAdmin(UserAdmin):
         ('Personal Info', {'fields': ('full_name',)}),
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
+        ('Check-in', {'fields': ('check_in_interval', 'next_due_at')}),
     )
     
     add_fieldsets = (
@@ -60,27 +134,41 @@ class CustomUserAdmin(UserAdmin):
 # --- Legacy System Models ---
 
 @admin.register(Vault)
-class VaultAdmin(admin.ModelAdmin):
+class VaultAdmin(LargeTableAdmin):
     list_display = ('user', 'item_count', 'updated_at')
     readonly_fields = ('ciphertext', 'iv', 'salt')
-    search_fields = ('user__email', 'user__full_name')
+    search_fields = ('=user__email', '^user__full_name')
+    search_help_text = "Owner's full email address, or the start of their name."
+    list_defer = ('ciphertext', 'ciphertext_raw')
+
+
+@admin.register(VaultItem)
+class VaultItemAdmin(LargeTableAdmin):
+    list_display = ('item_id', 'user', 'version', 'is_deleted', 'updated_at')
+    readonly_fields = ('ciphertext', 'iv')
+    search_fields = ('=item_id', '=user__email')
+    search_help_text = "Full item ID or owner's full email address."
+    list_defer = ('ciphertext',)
 
 
 @admin.register(Letter)
-class LetterAdmin(admin.ModelAdmin):
+class LetterAdmin(LargeTableAdmin):
     list_display = ('recipient', 'user', 'created_at')
     readonly_fields = ('ciphertext', 'iv', 'salt')
-    search_fields = ('recipient', 'user__email')
+    search_fields = ('^recipient', '=user__email')
+    search_help_text = "Start of the recipient, or the owner's full email address."
+    list_defer = ('ciphertext', 'ciphertext_raw')
 
 
 # --- Executor System ---
 
 @admin.register(Executor)
-class ExecutorAdmin(admin.ModelAdmin):
+class ExecutorAdmin(LargeTableAdmin):
     list_display = ('name', 'relationship', 'user', 'status', 'is_verified', 'view_document')
     list_editable = ('status', 'is_verified')
     readonly_fields = ('view_document',)
-    search_fields = ('name', 'email', 'user__email')
+    search_fields = ('^name', '=email', '=user__email')
+    search_help_text = "Start of the name, or the executor's or owner's full email address."
     
     # Registered dual actions for the dropdown menu
     actions = [
@@ -91,72 +179,79 @@ class ExecutorAdmin(admin.ModelAdmin):
     # 1. Custom Field: View Uploaded Document
     def view_document(self, obj):
         if obj.verification_document:
-            return mark_safe(f'<a href="{obj.verification_document.url}" target="_blank" style="color: #E5B869; font-weight: bold;">View Proof</a>')
+            # Through document_view, media isn't served publicly
+            url = reverse('admin:api_executor_document', args=[obj.pk])
+            return format_html('<a href="{}" target="_blank" style="color: #E5B869; font-weight: bold;">View Proof</a>', url)
         return "No Upload"
     view_document.short_description = 'Verification File'
 
+    def get_urls(self):
+        return [
+            path('<path:object_id>/document/', self.admin_site.admin_view(self.document_view), name='api_executor_document'),
+        ] + super().get_urls()
+
+    def document_view(self, request, object_id):
+        executor = self.get_object(request, unquote(object_id))
+        if executor is None:
+            raise Http404("Executor not found.")
+        if not self.has_view_permission(request, executor):
+            raise PermissionDenied
+        if not executor.verification_document:
+            raise Http404("No document uploaded.")
+        return documents.serve(request, executor.verification_document)
+
     # 2. Automated Action: Send Access Email on Status Change
     def save_model(self, request, obj, form, change):
         if change:
             old_obj = Executor.objects.get(pk=obj.pk)
             # Trigger email only when status moves to Access_Granted and is_verified is checked
-            if old_obj.status != 'Access_Granted' and obj.status == 'Access_Granted' and obj.is_verified:
+            if old_obj.status != Executor.Status.ACCESS_GRANTED and obj.status == Executor.Status.ACCESS_GRANTED and obj.is_verified:
                 self.send_access_granted_email(obj)
         super().save_model(request, obj, form, change)
 
     def send_access_granted_email(self, executor):
-        subject = f"Final Access Granted: {executor.user.full_name}'s Legacy"
-        context = {
-            'executor_name': executor.name,
-            'user_name': executor.user.full_name,
-            'login_email': executor.user.email,
-            'site_url': 'http://localhost:5173/unlock-legacy'
-        }
-        html_content = render_to_string('emails/access_granted.html', context)
-        text_content = strip_tags(html_content)
-        msg = EmailMultiAlternatives(subject, text_content, None, [executor.email])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        # Queued in the outbox, the deliver_outbox worker does the SMTP part
+        emails.enqueue([emails.access_granted(executor)], source='admin')
 
     # 3. Manual Action: Trigger Initial Notification
     @admin.action(description="Force Send Dead-Man Notification")
     def trigger_deadman_notification(self, request, queryset):
-        success_count = 0
-        for executor in queryset:
-            try:
-                subject = f"Security Protocol Initiated: {executor.user.full_name}"
-                context = {
-                    'executor_name': executor.name,
-                    'user_name': executor.user.full_name,
-                    'site_url': 'http://localhost:5173/executor-portal'
-                }
-                html_content = render_to_string('emails/deadman_notification.html', context)
-                text_content = strip_tags(html_content)
-                msg = EmailMultiAlternatives(subject, text_content, None, [executor.email])
-                msg.attach_alternative(html_content, "text/html")
-                msg.send()
-
-                executor.status = 'Verification_Pending'
-                executor.save()
-                success_count += 1
-            except Exception as e:
-                self.message_user(request, f"Error sending to {executor.name}: {str(e)}", level='error')
-        
-        self.message_user(request, f"Sent {success_count} initial notifications successfully.")
+        executors = list(queryset.select_related('user'))
+        with transaction.atomic():
+            emails.enqueue([emails.deadman_notification(executor) for executor in executors], source='admin')
+            queryset.update(status=Executor.Status.VERIFICATION_PENDING, updated_at=timezone.now())
+
+        self.message_user(request, f"Queued {len(executors)} initial notifications for delivery.")
 
     # 4. Manual Action: Trigger Access Granted Email
     @admin.action(description="Force Send Access Granted Email")
     def trigger_access_granted_manual(self, request, queryset):
-        success_count = 0
-        for executor in queryset:
-            if executor.is_verified and executor.status == 'Access_Granted':
-                try:
-                    self.send_access_granted_email(executor)
-                    success_count += 1
-                except Exception as e:
-                    self.message_user(request, f"Error sending to {executor.name}: {str(e)}", level='error')
+        ready = []
+        for executor in queryset.select_related('user'):
+            if executor.is_verified and executor.status == Executor.Status.ACCESS_GRANTED:
+                ready.append(executor)
             else:
                 self.message_user(request, f"Skipped {executor.name}: Status must be 'Access_Granted' and 'Is verified' must be checked.", level='warning')
-        
-        if success_count > 0:
-            self.message_user(request, f"Sent {success_count} final access emails successfully.")
\ No newline at end of file
+
+        if ready:
+            emails.enqueue([emails.access_granted(executor) for executor in ready], source='admin')
+            self.message_user(request, f"Queued {len(ready)} final access emails for delivery.")
+
+
+# --- Notification Outbox ---
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(LargeTableAdmin):
+    list_display = ('subject', 'to', 'source', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_select_related = False
+    list_defer = ('body_text', 'body_html', 'last_error')
+    list_filter = ('status', 'source')
+    readonly_fields = ('subject', 'to', 'source', 'body_text', 'body_html', 'attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    @admin.action(description="Retry selected emails now")
+    def retry_now(self, request, queryset):
+        count = queryset.exclude(status=OutboundEmail.Status.SENT).update(
+            status=OutboundEmail.Status.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"Requeued {count} emails.")
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # Connects the cache invalidation receivers and registers the replica cache check
+        from . import routers, signals  # noqa: F401
@@ -0,0 +1,259 @@
+"""
+Async (ASGI) variants of API views. Under ASGI these run on the event loop, and
+anything CPU-heavy is awaited on a worker pool instead of blocking it.
+
+The read views use the async ORM and return the same bodies, ETags and 304s as
+their DRF counterparts. Cache calls go through Django's async cache API (or one
+thread hop for the throttle), so a network cache never blocks the event loop.
+"""
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+
+from . import summary
+from .authentication import ClaimsJWTAuthentication
+from .conditional import is_not_modified, make_etag, with_etag
+from .hashing import HashingBusy
+from .models import Executor, Letter, User, Vault
+from .pagination import LetterCursorPagination
+from .routers import read_from_replica
+from .serializers import LetterSerializer, LetterSummarySerializer, UserRegistrationSerializer, VaultSerializer
+from .throttling import consume
+from .views import CustomLoginSerializer, dashboard_payload
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _throttled(request, scope, email):
+    # One hop for the whole check rather than one per cache call
+    allowed, wait = await sync_to_async(consume)(
+        scope, BaseThrottle().get_ident(request), lambda: str(email or '').strip().lower()
+    )
+    if allowed:
+        return None
+    response = JsonResponse({"detail": "Request was throttled."}, status=429)
+    if wait:
+        response['Retry-After'] = str(int(wait) + 1)
+    return response
+
+
+def _hashing_busy(e):
+    # DRF would turn HashingBusy into this for the sync views
+    response = JsonResponse({"detail": e.detail}, status=e.status_code)
+    response['Retry-After'] = str(e.wait)
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def login(request):
+    """
+    Same contract as LoginView, with the password check awaited on the hashing pool.
+    """
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({"detail": "Invalid JSON body."}, status=400)
+
+    throttled = await _throttled(request, 'login', data.get('email'))
+    if throttled:
+        return throttled
+
+    try:
+        user = await aauthenticate(request, email=data.get('email'), password=data.get('password'))
+    except HashingBusy as e:
+        return _hashing_busy(e)
+    if user is None:
+        return JsonResponse({"detail": "No active account found with the given credentials"}, status=401)
+
+    # A successful login is a check-in for the dead-man switch
+    await User.objects.arecord_check_in(user.pk)
+    await summary.ainvalidate(user.pk)
+
+    refresh = CustomLoginSerializer.get_token(user)
+    return JsonResponse({
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'user': {
+            'id': user.id,
+            'email': user.email,
+            'full_name': user.full_name,
+        },
+    })
+
+
+@csrf_exempt
+@require_POST
+async def register(request):
+    """
+    Same contract as RegisterUserView, with the password hashed on the hashing pool.
+    """
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({"detail": "Invalid JSON body."}, status=400)
+
+    throttled = await _throttled(request, 'register', data.get('email'))
+    if throttled:
+        return throttled
+
+    serializer = UserRegistrationSerializer(data=data)
+    # Validation checks email uniqueness against the database
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+
+    validated = serializer.validated_data
+    try:
+        user = await User.objects.acreate_user(
+            email=validated['email'],
+            password=validated['password'],
+            full_name=validated.get('full_name', '')
+        )
+    except HashingBusy as e:
+        return _hashing_busy(e)
+    return JsonResponse(UserRegistrationSerializer(user).data, status=201)
+
+
+def _not_modified(etag):
+    return with_etag(HttpResponseNotModified(), etag)
+
+
+def _authenticated(view):
+    """
+    IsAuthenticated for the async views, with the same JWT checks and 401 bodies as DRF.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        authenticator = ClaimsJWTAuthentication()
+        try:
+            result = await authenticator.aauthenticate(request)
+        except AuthenticationFailed as e:
+            result, detail = None, e.detail
+        else:
+            detail = "Authentication credentials were not provided."
+        if result is None:
+            response = JsonResponse(detail if isinstance(detail, dict) else {"detail": detail}, status=401)
+            response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            return response
+
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_safe
+@_authenticated
+@read_from_replica
+async def dashboard(request):
+    """
+    Same contract as dashboard_stats.
+    """
+    return JsonResponse(dashboard_payload(await summary.aget_summary(request.user.pk)))
+
+
+@require_safe
+@_authenticated
+@read_from_replica
+async def vault(request):
+    """
+    Same contract as VaultView.get.
+    """
+    user_id = request.user.pk
+    # Check the version first so an unchanged vault never loads the ciphertext
+    version = await Vault.objects.filter(user_id=user_id).values_list('version', flat=True).afirst()
+    if version is None:
+        return JsonResponse({"message": "Vault not initialized"})
+
+    etag = make_etag(user_id, version)
+    if is_not_modified(request, etag):
+        return _not_modified(etag)
+
+    vault = await Vault.objects.aget(user_id=user_id)
+    return with_etag(JsonResponse(VaultSerializer(vault).data), make_etag(user_id, vault.version))
+
+
+@require_safe
+@_authenticated
+@read_from_replica
+async def letter_list(request):
+    """
+    Same contract as LetterView.get.
+    """
+    user_id = request.user.pk
+    letters = Letter.objects.filter(user_id=user_id)
+
+    latest = await letters.aaggregate(count=Count('id'), latest=Max('updated_at'))
+    etag = make_etag(user_id, latest['count'], latest['latest'] or 0)
+    if is_not_modified(request, etag):
+        return _not_modified(etag)
+
+    # DRF's cursor paging is sync. The async ORM hands each query to a thread
+    # as well, so running the page query this way costs the same single hop.
+    paginator = LetterCursorPagination()
+    try:
+        page = await sync_to_async(paginator.paginate_queryset)(
+            letters.only('id', 'title', 'recipient', 'created_at'), Request(request)
+        )
+    except NotFound as e:
+        return JsonResponse({"detail": e.detail}, status=404)
+    data = paginator.get_paginated_response(LetterSummarySerializer(page, many=True).data).data
+    return with_etag(JsonResponse(data), etag)
+
+
+@require_safe
+@_authenticated
+@read_from_replica
+async def letter_detail(request, pk):
+    """
+    Same contract as LetterDetailView.get.
+    """
+    user_id = request.user.pk
+    updated_at = await Letter.objects.filter(user_id=user_id, pk=pk).values_list('updated_at', flat=True).afirst()
+    if updated_at is None:
+        return JsonResponse({"error": "Letter not found."}, status=404)
+
+    etag = make_etag(user_id, pk, updated_at)
+    if is_not_modified(request, etag):
+        return _not_modified(etag)
+
+    letter = await Letter.objects.aget(user_id=user_id, pk=pk)
+    return with_etag(JsonResponse(LetterSerializer(letter).data), make_etag(user_id, pk, letter.updated_at))
+
+
+@require_safe
+@_authenticated
+@read_from_replica
+async def executor(request):
+    """
+    Same contract as ExecutorView.get.
+    """
+    user_id = request.user.pk
+    try:
+        executor = await Executor.objects.only('name', 'email', 'status', 'relationship', 'updated_at').aget(user_id=user_id)
+    except Executor.DoesNotExist:
+        # 404 so the frontend knows to show the "Assign" form
+        return JsonResponse({"message": "No executor assigned"}, status=404)
+
+    etag = make_etag(user_id, executor.updated_at)
+    if is_not_modified(request, etag):
+        return _not_modified(etag)
+
+    return with_etag(JsonResponse({
+        "name": executor.name,
+        "email": executor.email,
+        "status": executor.get_status_display(),
+        "relationship": executor.relationship
+    }), etag)
@@ -0,0 +1,180 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from . import heartbeat
+from .models import User
+
+# Claims added to every token at login (see CustomLoginSerializer.get_token).
+# Never is_staff: it would outlive a demotion for as long as the token does, see permissions.IsStaff.
+USER_CLAIMS = ('email', 'full_name', 'is_active')
+
+_users = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+
+def _inactive_key(user_id):
+    return f"auth:inactive:{user_id}"
+
+
+def add_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def _get_cached(user_id):
+    with _lock:
+        entry = _users.get(user_id)
+        if entry is None:
+            return None
+        expires, user = entry
+        if expires < time.monotonic():
+            del _users[user_id]
+            return None
+        _users.move_to_end(user_id)
+    # Each request gets its own copy, so nothing one view sets on request.user leaks into another
+    return copy.copy(user)
+
+
+def _remember(user_id, user):
+    user = copy.copy(user)
+    with _lock:
+        _users[user_id] = (time.monotonic() + settings.AUTH_USER_CACHE_TTL, user)
+        _users.move_to_end(user_id)
+        while len(_users) > settings.AUTH_USER_CACHE_SIZE:
+            _users.popitem(last=False)
+
+
+def forget(user_id):
+    with _lock:
+        _users.pop(user_id, None)
+
+
+def mark_inactive(user_id, inactive=True):
+    """
+    Deactivation has to reach every worker: this process drops its entry straight away,
+    the others see the shared marker once their own entry expires (AUTH_USER_CACHE_TTL).
+    """
+    forget(user_id)
+    try:
+        if inactive:
+            # Outlives any token issued while the user was still active
+            _cache().set(_inactive_key(user_id), True, int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()))
+        else:
+            _cache().delete(_inactive_key(user_id))
+    except Exception:
+        pass
+
+
+def _is_marked_inactive(user_id):
+    try:
+        return bool(_cache().get(_inactive_key(user_id)))
+    except Exception:
+        return False
+
+
+async def _ais_marked_inactive(user_id):
+    try:
+        return bool(await _cache().aget(_inactive_key(user_id)))
+    except Exception:
+        return False
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that builds request.user from the token's claims instead of
+    loading the User row on every request. Only id, email, full_name and is_active
+    are populated, so views that need anything else (is_staff too) must query for it.
+    Tokens issued before the claims existed fall back to the database lookup.
+    With HEARTBEAT_ON_REQUEST every authenticated request also counts as activity.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None and settings.HEARTBEAT_ON_REQUEST:
+            heartbeat.record(result[0].pk)
+        return result
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for the async views. The deactivation marker is read through
+        the async cache API, and the user is only loaded (off the event loop) when
+        the token predates the claims.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        user_id, user = await self.aget_user_without_query(validated_token)
+        if user is None:
+            user = await sync_to_async(super().get_user)(validated_token)
+            _remember(user_id, user)
+        if settings.HEARTBEAT_ON_REQUEST:
+            heartbeat.record(user.pk)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        user_id, user = self.get_user_without_query(validated_token)
+        if user is None:
+            user = super().get_user(validated_token)
+            _remember(user_id, user)
+        return user
+
+    def get_user_without_query(self, validated_token):
+        """
+        (user_id, user) from the cache or the token's claims, with user None
+        when it can only come from the database.
+        """
+        user_id = self._user_id(validated_token)
+        user = _get_cached(user_id)
+        if user is not None:
+            return user_id, user
+        return user_id, self._user_from_claims(user_id, validated_token, _is_marked_inactive(user_id))
+
+    async def aget_user_without_query(self, validated_token):
+        user_id = self._user_id(validated_token)
+        user = _get_cached(user_id)
+        if user is not None:
+            return user_id, user
+        return user_id, self._user_from_claims(user_id, validated_token, await _ais_marked_inactive(user_id))
+
+    def _user_id(self, validated_token):
+        try:
+            return User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise AuthenticationFailed(_("Token contained no recognizable user identification"), code="token_not_valid")
+
+    def _user_from_claims(self, user_id, validated_token, marked_inactive):
+        # None when the token predates the claims
+        if marked_inactive:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            return None
+        if not validated_token['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        user = User(pk=user_id, **{claim: validated_token[claim] for claim in USER_CLAIMS})
+        # Not a fresh row, it just wasn't loaded from the database
+        user._state.adding = False
+        # Password, last_login, is_staff... are blank here, a save() would wipe them
+        user.from_claims = True
+        _remember(user_id, user)
+        return user
@@ -0,0 +1,243 @@
+"""
+Helpers shared by the benchmark management commands: a throwaway database,
+in-process WSGI and ASGI servers, a many-connection HTTP client, per-request
+query counting and latency stats.
+"""
+import asyncio
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(seconds):
+    """
+    Milliseconds, rounded, for the JSON report.
+    """
+    values = sorted(s * 1000 for s in seconds)
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(sum(values) / len(values), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def environment():
+    """
+    What a result was measured on, so reports from different releases can be compared.
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "measured_at": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+@contextmanager
+def bench_database(keep=False):
+    """
+    Creates a fresh database next to the configured one (a temp file for SQLite,
+    test_<name> otherwise), migrates it and points the default connection at it.
+    """
+    db = connections['default']
+    tmpdir = None
+    if db.vendor == 'sqlite':
+        # A file rather than :memory: so the server threads share one database
+        tmpdir = tempfile.mkdtemp(prefix='quackroach-bench-')
+        db.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+
+    old_name = db.settings_dict['NAME']
+    name = db.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield name
+    finally:
+        if not keep:
+            db.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                try:
+                    os.rmdir(tmpdir)
+                except OSError:
+                    pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _BenchWSGIServer(ThreadedWSGIServer):
+    # socketserver's listen backlog is 5, hundreds of clients connecting at once would get refused
+    request_queue_size = 1024
+
+
+@contextmanager
+def serve(app, host='127.0.0.1'):
+    """
+    Serves a WSGI app on a free port from a background thread, one thread per request.
+    Yields (host, port).
+    """
+    server = _BenchWSGIServer((host, 0), _QuietHandler, allow_reuse_address=True)
+    server.set_app(app)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield host, server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@contextmanager
+def serve_asgi(app, host='127.0.0.1'):
+    """
+    Serves an ASGI app with uvicorn on a free port, its event loop running in a
+    background thread. Yields (host, port).
+    """
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, 0))
+    server = uvicorn.Server(uvicorn.Config(app, lifespan='off', log_level='warning', access_log=False, backlog=1024))
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError('uvicorn failed to start')
+        time.sleep(0.01)
+    try:
+        yield host, sock.getsockname()[1]
+    finally:
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+
+async def _fetch(host, port, method, path, headers):
+    # One request per connection, read until the server closes it
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        status_line = await reader.readline()
+        while await reader.read(65536):
+            pass
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+def hammer(host, port, requests, clients, timeout=120):
+    """
+    Sends (method, path, headers) requests over `clients` concurrent connections
+    from one event loop, so the client side doesn't need a thread per connection.
+    Returns (wall seconds, latencies, {status: count}).
+    """
+    latencies = []
+    statuses = {}
+    pending = iter(requests)
+
+    async def client():
+        for method, path, headers in pending:
+            started = time.perf_counter()
+            try:
+                code = await asyncio.wait_for(_fetch(host, port, method, path, headers), timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                code = 'connection_error'
+            latencies.append(time.perf_counter() - started)
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+
+    async def run():
+        await asyncio.gather(*(client() for _ in range(clients)))
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - started, latencies, statuses
+
+
+class QueryCounter:
+    """
+    Wraps a WSGI app and counts the SQL statements each request runs, including
+    ones issued while a streaming response is iterated. Requests are grouped by
+    their X-Bench-Label header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+        self.counts = {}
+        self.lock = threading.Lock()
+        connection_created.connect(self._install, weak=False)
+
+    def _install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self._count)
+
+    def _count(self, execute, sql, params, many, context):
+        self.local.queries = getattr(self.local, 'queries', 0) + 1
+        return execute(sql, params, many, context)
+
+    def __call__(self, environ, start_response):
+        self.local.queries = 0
+        label = environ.get('HTTP_X_BENCH_LABEL', 'unlabelled')
+        result = self.app(environ, start_response)
+        try:
+            for chunk in result:
+                yield chunk
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+            with self.lock:
+                self.counts.setdefault(label, []).append(self.local.queries)
+
+    def close(self):
+        connection_created.disconnect(self._install)
+
+
+def write_report(report, path=None, stdout=None):
+    text = json.dumps(report, indent=2, default=str)
+    if path:
+        with open(path, 'w') as fh:
+            fh.write(text + '\n')
+    elif stdout is not None:
+        stdout.write(text)
+    return text
@@ -0,0 +1,59 @@
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """
+    Builds a strong validator from cheap, already-indexed values (ids, versions, timestamps).
+    Callers always include the user id so one browser shared by two accounts never gets a false 304.
+    """
+    return quote_etag('-'.join(_part(p) for p in parts))
+
+
+def _part(value):
+    if hasattr(value, 'timestamp'):
+        return str(int(value.timestamp() * 1_000_000))
+    return str(value)
+
+
+def is_not_modified(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison, so a W/ prefix still counts as a match
+    candidates = [tag.removeprefix('W/') for tag in parse_etags(header)]
+    return '*' in candidates or etag in candidates
+
+
+def expected_version(request, user_id):
+    """
+    The version a write is based on, taken from an If-Match ETag we handed out
+    (make_etag(user_id, version)), or 0 for `If-None-Match: *` (create only).
+    Returns None without a precondition, and -1 for a tag that can't match.
+    """
+    if_match = request.META.get('HTTP_IF_MATCH', '').strip()
+    if if_match == '*':
+        return None
+    if if_match:
+        for tag in parse_etags(if_match):
+            owner, _, version = tag.removeprefix('W/').strip('"').partition('-')
+            if owner == str(user_id) and version.isdigit():
+                return int(version)
+        return -1
+    if request.META.get('HTTP_IF_NONE_MATCH', '').strip() == '*':
+        return 0
+    return None
+
+
+def with_etag(response, etag):
+    response['ETag'] = etag
+    # Private: the payload is per-user. no-cache: the browser revalidates on every visit.
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def not_modified(etag):
+    return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
@@ -0,0 +1,110 @@
+"""
+The dead-man switch pass, shared by check_deadman_switch (one pass per cron run)
+and run_deadman_scheduler (a resident process doing a pass every interval).
+
+Executors are claimed a chunk at a time with SELECT ... FOR UPDATE SKIP LOCKED and
+their status flipped (and emails queued) in the same short transaction, so any
+number of processes on any number of nodes can scan at once without two of them
+notifying the same executor. Emails sent directly go out after that commit, so no
+row stays locked while the mail server is slow, but only at most once: a crash
+between the commit and the send loses them. The commands queue to the outbox
+(sent at least once by deliver_outbox) unless run with --direct.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import emails, metrics
+from .models import Executor
+
+
+def due_executors(now=None):
+    """
+    Active executors whose user missed their check-in deadline. next_due_at is indexed,
+    so this is a range scan; the user is loaded in the same query.
+    """
+    return Executor.objects.filter(
+        user__next_due_at__lt=now or timezone.now(),
+        status=Executor.Status.ACTIVE
+    ).select_related('user').only('name', 'email', 'user__full_name').order_by('pk')
+
+
+def mark_notified(executor_ids):
+    # One UPDATE per batch instead of one save() per executor
+    if executor_ids:
+        Executor.objects.filter(pk__in=executor_ids).update(
+            status=Executor.Status.VERIFICATION_PENDING, updated_at=timezone.now()
+        )
+
+
+def unmark_notified(executor_ids):
+    # Back to active so the next pass tries again, unless an admin has moved them on meanwhile
+    if executor_ids:
+        Executor.objects.filter(pk__in=executor_ids, status=Executor.Status.VERIFICATION_PENDING).update(
+            status=Executor.Status.ACTIVE, updated_at=timezone.now()
+        )
+
+
+def process_due(chunk_size=500, outbox=False, workers=0, now=None):
+    """
+    Notifies every due executor, one locked chunk at a time. Yields one
+    (executors, errors) pair per chunk once it is done, where errors has an
+    entry per executor: None when sent or queued, otherwise the exception.
+    Closing the generator between chunks stops the pass cleanly.
+    """
+    executors = due_executors(now)
+
+    # Walk by primary key: executors whose email failed are due again, and are
+    # left for the next pass instead of being retried straight away
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            # Only the executor rows are locked, rows another node holds are skipped
+            batch = list(
+                executors.filter(pk__gt=last_pk)
+                .select_for_update(skip_locked=True, of=('self',))[:chunk_size]
+            )
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+
+            messages = [emails.deadman_notification(e) for e in batch]
+            # Flipped before anything is sent, so no other node picks them up once the locks go
+            mark_notified([e.pk for e in batch])
+            if outbox:
+                # Queued with the status change, deliver_outbox does the sending
+                emails.enqueue(messages, source='deadman')
+
+        if outbox:
+            errors = [None] * len(batch)
+        else:
+            errors = emails.send_batch(messages, workers=workers)
+            metrics.record_emails('deadman', errors)
+            unmark_notified([e.pk for e, error in zip(batch, errors) if error is not None])
+        metrics.DEADMAN_NOTIFIED.inc(errors.count(None))
+
+        yield batch, errors
+
+        if len(batch) < chunk_size:
+            return
+
+
+@contextmanager
+def recorded_run():
+    """
+    Counts a pass in the dead-man metrics: outcome, duration and, when it
+    finishes without an error, the last success time.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.DEADMAN_RUNS.labels('error').inc()
+        raise
+    else:
+        metrics.DEADMAN_RUNS.labels('success').inc()
+        metrics.DEADMAN_LAST_SUCCESS.set(time.time())
+    finally:
+        metrics.DEADMAN_DURATION.observe(time.perf_counter() - started)
@@ -0,0 +1,147 @@
+"""
+Serving executor verification documents to the admin.
+
+Media isn't public: the admin view checks permissions, then either hands the
+transfer to the front proxy (settings.DOCUMENT_SENDFILE) so no Python worker is
+tied up sending the file, or streams it from storage itself a chunk at a time,
+honouring single Range requests so browsers' PDF viewers can fetch pages and
+interrupted downloads can resume. Only the upload allowlist's types (PDF, JPEG,
+PNG) are shown inline, anything else an old upload left behind is downloaded.
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+
+from .parsers import CHUNK_SIZE
+from .uploads import SIGNATURES
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# The types uploads are checked against, the only ones a browser is asked to render
+INLINE_TYPES = frozenset(SIGNATURES)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def byte_range(header, size):
+    """
+    (start, end), both inclusive, for a single `bytes=` range, or None to send
+    the whole file (no header, several ranges, or one we don't understand).
+    Raises RangeNotSatisfiable when the range starts past the end of the file.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # bytes=-N is the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _read(field_file, start, length):
+    # Opened per response, so nothing is held until the client actually reads
+    with field_file.storage.open(field_file.name, 'rb') as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            block = fh.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def _content_type(field_file):
+    # None for anything outside the allowlist, e.g. proof.html must never be served as HTML
+    guessed = mimetypes.guess_type(field_file.name)[0]
+    return guessed if guessed in INLINE_TYPES else None
+
+
+def _headers(response, field_file, content_type):
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    response['Content-Disposition'] = content_disposition_header(content_type is None, field_file.name.rsplit('/', 1)[-1])
+    response['X-Content-Type-Options'] = 'nosniff'
+    # No scripts, forms or same-origin access, even if a file isn't what its name says
+    response['Content-Security-Policy'] = 'sandbox'
+    # Death certificates and IDs: never kept in a shared or on-disk cache
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def _offloaded(field_file, content_type):
+    if settings.DOCUMENT_SENDFILE == 'x-accel-redirect':
+        # An `internal` nginx location mapped onto MEDIA_ROOT
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = settings.DOCUMENT_ACCEL_PREFIX.rstrip('/') + '/' + quote(field_file.name)
+    elif settings.DOCUMENT_SENDFILE == 'x-sendfile':
+        try:
+            path = field_file.path
+        except NotImplementedError:
+            # Remote storage has no path to hand over
+            return None
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+    else:
+        return None
+    # The proxy adds Content-Length and deals with Range itself
+    return _headers(response, field_file, content_type)
+
+
+def serve(request, field_file):
+    """
+    The response for one stored file, offloaded to the proxy when configured,
+    otherwise streamed with Range support.
+    """
+    content_type = _content_type(field_file)
+    response = _offloaded(field_file, content_type)
+    if response is not None:
+        return response
+
+    storage = field_file.storage
+    size = storage.size(field_file.name)
+    try:
+        modified = int(storage.get_modified_time(field_file.name).timestamp())
+    except NotImplementedError:
+        modified = 0
+    # Also changes if a replacement ends up under the same name and size
+    etag = quote_etag(f"{field_file.name}-{size}-{modified}")
+
+    requested = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if requested and if_range and etag not in parse_etags(if_range):
+        # The client's partial copy is of another version, send it all again
+        requested = None
+    try:
+        span = byte_range(requested, size) if request.method in ('GET', 'HEAD') else None
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+
+    start, end = span or (0, size - 1)
+    length = max(0, end - start + 1)
+    response = StreamingHttpResponse(_read(field_file, start, length), status=206 if span else 200)
+    _headers(response, field_file, content_type)
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if span:
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    return response
@@ -0,0 +1,189 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from . import metrics
+from .models import OutboundEmail
+
+
+def _build(subject, template, context, recipient):
+    # Render HTML and create plain-text fallback
+    html_content = render_to_string(template, context)
+    text_content = strip_tags(html_content)
+    msg = EmailMultiAlternatives(subject, text_content, None, [recipient]) # None uses DEFAULT_FROM_EMAIL
+    msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
+def deadman_notification(executor):
+    return _build(
+        f"Security Protocol Initiated: {executor.user.full_name}",
+        'emails/deadman_notification.html',
+        {
+            'executor_name': executor.name,
+            'user_name': executor.user.full_name,
+            'site_url': settings.FRONTEND_URL,
+        },
+        executor.email,
+    )
+
+
+def access_granted(executor):
+    return _build(
+        f"Final Access Granted: {executor.user.full_name}'s Legacy",
+        'emails/access_granted.html',
+        {
+            'executor_name': executor.name,
+            'user_name': executor.user.full_name,
+            'login_email': executor.user.email,
+            'site_url': f"{settings.FRONTEND_URL}/unlock-legacy",
+        },
+        executor.email,
+    )
+
+
+def _send(connection, message):
+    try:
+        # Opening first keeps the backend from closing the connection after this message
+        connection.open()
+        connection.send_messages([message])
+        return None
+    except Exception as e:
+        # The server may have dropped us, start the next message on a fresh connection
+        connection.close()
+        return e
+
+
+def send_batch(messages, workers=0):
+    """
+    Sends messages over reused mail connections instead of one connection per message.
+    With workers > 1 each pool thread keeps its own connection (SMTP sessions aren't thread-safe).
+    Returns one entry per message: None when sent, otherwise the exception.
+    """
+    if workers <= 1:
+        connection = get_connection()
+        try:
+            return [_send(connection, message) for message in messages]
+        finally:
+            connection.close()
+
+    local = threading.local()
+    opened = []
+    lock = threading.Lock()
+
+    def send(message):
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = get_connection()
+            with lock:
+                opened.append(connection)
+        return _send(connection, message)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(send, messages))
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+# --- Outbox ---
+
+def enqueue(messages, source=''):
+    """
+    Stores messages in the outbox instead of sending them. Returns the created rows.
+    `source` says what queued them and labels their delivery metrics.
+    """
+    rows = []
+    for message in messages:
+        html = next((content for content, mimetype in getattr(message, 'alternatives', []) if mimetype == "text/html"), '')
+        rows.append(OutboundEmail(subject=message.subject, to=list(message.to), body_text=message.body, body_html=html, source=source))
+    rows = OutboundEmail.objects.bulk_create(rows)
+    if rows:
+        metrics.EMAILS_QUEUED.labels(source or 'unknown').inc(len(rows))
+    return rows
+
+
+def _as_message(row):
+    msg = EmailMultiAlternatives(row.subject, row.body_text, None, row.to)
+    if row.body_html:
+        msg.attach_alternative(row.body_html, "text/html")
+    return msg
+
+
+def retry_delay(attempts):
+    # 1, 2, 4, 8... minutes, capped at an hour
+    return timedelta(minutes=min(2 ** (attempts - 1), 60))
+
+
+def claim_due(batch_size=100, now=None):
+    """
+    Leases up to batch_size due messages to the caller for OUTBOX_LEASE_SECONDS.
+    The claim is committed straight away, so no row lock is held while they are sent.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.Status.PENDING, next_attempt_at__lte=now)
+            .filter(Q(sending_until__isnull=True) | Q(sending_until__lte=now))
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if rows:
+            OutboundEmail.objects.filter(pk__in=[row.pk for row in rows]).update(
+                sending_until=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+            )
+    return rows
+
+
+def deliver_due(batch_size=100, workers=0, max_attempts=5):
+    """
+    Sends one batch of due outbox messages and records the outcome of each.
+    Rows are claimed with a lease (see claim_due), so several workers can drain the
+    outbox together and one that dies mid-batch only delays its rows.
+    Returns (sent, failed) counts.
+    """
+    rows = claim_due(batch_size)
+    if not rows:
+        return 0, 0
+
+    results = send_batch([_as_message(row) for row in rows], workers=workers)
+    now = timezone.now()
+    outcomes = {}
+    for row, error in zip(rows, results):
+        outcomes.setdefault(row.source, []).append(error)
+    for source, errors in outcomes.items():
+        metrics.record_emails(source, errors)
+
+    sent = [row.pk for row, error in zip(rows, results) if error is None]
+    if sent:
+        OutboundEmail.objects.filter(pk__in=sent).update(
+            status=OutboundEmail.Status.SENT, attempts=F('attempts') + 1, sent_at=now,
+            sending_until=None, last_error=''
+        )
+
+    failed = []
+    for row, error in zip(rows, results):
+        if error is None:
+            continue
+        row.attempts += 1
+        row.last_error = str(error)
+        row.sending_until = None
+        if row.attempts >= max_attempts:
+            row.status = OutboundEmail.Status.FAILED
+        else:
+            row.next_attempt_at = now + retry_delay(row.attempts)
+        failed.append(row)
+    if failed:
+        OutboundEmail.objects.bulk_update(failed, ['attempts', 'last_error', 'status', 'next_attempt_at', 'sending_until'])
+
+    return len(sent), len(failed)
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress, please try again in a moment.'
+    default_code = 'hashing_busy'
+    # Sent as Retry-After; DRF's exception handler picks it up like Throttled.wait
+    wait = 1
+
+
+class HashingPool:
+    """
+    Runs password hashing on a fixed number of threads so a login spike can only
+    use that many cores. Up to `queue_limit` more calls may wait for a thread;
+    beyond that callers get HashingBusy right away instead of piling up.
+    """
+
+    def __init__(self, workers, queue_limit):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy()
+        with self._lock:
+            self.queued += 1
+        future = self._executor.submit(self._run, fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        # The event loop stays free while the hash runs on a pool thread
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "queue_depth": self.queued,
+            "active": self.active,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_LIMIT)
+    return _pool
+
+
+def make_password(password):
+    if password is None:
+        # Unusable password, nothing to hash
+        return hashers.make_password(None)
+    return get_pool().run(hashers.make_password, password)
+
+
+def verify_password(password, encoded):
+    """
+    Returns (is_correct, must_update) like django.contrib.auth.hashers.verify_password.
+    """
+    return get_pool().run(hashers.verify_password, password, encoded)
+
+
+async def amake_password(password):
+    if password is None:
+        return hashers.make_password(None)
+    return await get_pool().arun(hashers.make_password, password)
+
+
+async def averify_password(password, encoded):
+    return await get_pool().arun(hashers.verify_password, password, encoded)
+
+
+def stats():
+    # Don't spin the pool up just to report on it
+    return _pool.stats() if _pool is not None else None
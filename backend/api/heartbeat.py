@@ -0,0 +1,141 @@
+"""
+Write-behind activity tracking for the dead-man switch.
+
+record() only notes "this user was active at T" in memory. A background thread
+writes everything noted since its last run in one UPDATE every
+HEARTBEAT_FLUSH_INTERVAL seconds, keeping only the latest time per user, and users
+already written within HEARTBEAT_RESOLUTION seconds aren't noted again at all.
+A crashed worker loses at most one interval of activity, which at a check-in
+window measured in months doesn't matter.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, DateTimeField, F, Q, Value, When
+from django.utils import timezone
+
+from . import summary
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Users per UPDATE statement
+FLUSH_CHUNK_SIZE = 500
+
+_pending = {}
+# When each user was last written, so busy users don't cost a row per flush
+_written = OrderedDict()
+_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+
+
+def record(user_id, when=None):
+    """
+    Notes activity for a user. Never touches the database.
+    """
+    if not settings.HEARTBEAT_ENABLED:
+        return
+    now = time.monotonic()
+    with _lock:
+        written = _written.get(user_id)
+        if written is not None and now - written < settings.HEARTBEAT_RESOLUTION:
+            return
+        when = when or timezone.now()
+        if user_id not in _pending or _pending[user_id] < when:
+            _pending[user_id] = when
+        full = len(_pending) >= settings.HEARTBEAT_MAX_USERS
+    _ensure_flusher()
+    if full:
+        _wake.set()
+
+
+def _remember_written(user_ids):
+    now = time.monotonic()
+    with _lock:
+        for user_id in user_ids:
+            _written[user_id] = now
+            _written.move_to_end(user_id)
+        while len(_written) > settings.HEARTBEAT_MAX_USERS:
+            _written.popitem(last=False)
+
+
+def flush():
+    """
+    Writes the noted activity: last_login moves forward (never back) and
+    next_due_at follows it, one UPDATE per FLUSH_CHUNK_SIZE users.
+    Returns the number of users written.
+    """
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+
+    items = list(batch.items())
+    try:
+        for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+            chunk = items[start:start + FLUSH_CHUNK_SIZE]
+            # A login or explicit check-in may have written a later time meanwhile
+            newer = [
+                (user_id, Q(pk=user_id) & (Q(last_login__isnull=True) | Q(last_login__lt=when)), when)
+                for user_id, when in chunk
+            ]
+            User.objects.filter(pk__in=[user_id for user_id, _ in chunk]).update(
+                last_login=Case(
+                    *[When(condition, then=Value(when)) for _, condition, when in newer],
+                    default=F('last_login'), output_field=DateTimeField(),
+                ),
+                next_due_at=Case(
+                    *[When(condition, then=Value(when) + F('check_in_interval')) for _, condition, when in newer],
+                    default=F('next_due_at'), output_field=DateTimeField(),
+                ),
+            )
+            summary.invalidate_many([user_id for user_id, _ in chunk])
+            _remember_written([user_id for user_id, _ in chunk])
+    except Exception:
+        # Put back whatever wasn't written, the next flush tries again
+        with _lock:
+            for user_id, when in items[start:]:
+                if user_id not in _pending or _pending[user_id] < when:
+                    _pending[user_id] = when
+        logger.exception("Heartbeat flush failed, %d users kept for the next one", len(items) - start)
+        return start
+    return len(items)
+
+
+def _run():
+    while True:
+        _wake.wait(settings.HEARTBEAT_FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        finally:
+            # This thread's connection would otherwise stay open between flushes
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        # Started on first use, so each forked worker gets its own
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_run, name='heartbeat-flush', daemon=True)
+            _flusher.start()
+
+
+@atexit.register
+def _flush_at_exit():
+    # Graceful worker shutdowns don't drop the last interval
+    if _pending:
+        try:
+            flush()
+        except Exception:
+            pass
@@ -0,0 +1,212 @@
+"""
+Opt-in query and timing instrumentation (settings.QUERY_INSTRUMENTATION).
+
+Per request it records the SQL statement count and time, time spent in DRF
+serializers and the total time, sends them back in a Server-Timing header and
+logs slow requests and repeated (N+1 looking) SQL as JSON on the
+'api.instrumentation' logger. Streaming responses only count the work done
+before the first chunk is sent.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('api.instrumentation')
+
+_current = ContextVar('instrumentation_recorder', default=None)
+
+# Collapses the parts of a statement that change between otherwise identical queries
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_SPACE = re.compile(r'\s+')
+
+
+def sql_pattern(sql):
+    sql = _IN_LIST.sub('(...)', sql)
+    sql = _NUMBER.sub('N', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class Recorder:
+    """
+    Collects SQL and serializer timings for one unit of work (a request, a command run).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.patterns = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.query_count += 1
+            self.patterns[sql_pattern(sql)] += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def total_seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def repeated(self, threshold=None):
+        """
+        Statements run at least `threshold` times, most repeated first.
+        """
+        threshold = threshold or settings.N_PLUS_ONE_THRESHOLD
+        return [
+            {"count": count, "sql": pattern}
+            for pattern, count in self.patterns.most_common()
+            if count >= threshold
+        ]
+
+    def summary(self):
+        return {
+            "queries": self.query_count,
+            "db_ms": round(self.sql_seconds * 1000, 2),
+            "serializer_ms": round(self.serializer_seconds * 1000, 2),
+            "total_ms": round(self.total_seconds * 1000, 2),
+            "repeated_sql": self.repeated(),
+        }
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.sql_seconds * 1000:.2f};desc="{self.query_count} queries"',
+            f'serializer;dur={self.serializer_seconds * 1000:.2f}',
+            f'view;dur={self.total_seconds * 1000:.2f}',
+        ])
+
+
+def _dispatch(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def watch_connections():
+    """
+    Hooks this thread's connections up to whichever recorder is current. Stays
+    installed (a pass-through outside of a recorded block), so async requests can
+    call it from the thread their ORM calls run on.
+    """
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if _dispatch not in wrappers:
+            wrappers.append(_dispatch)
+
+
+@contextmanager
+def record():
+    """
+    Records every statement run on this thread's connections inside the block.
+    """
+    recorder = Recorder()
+    token = _current.set(recorder)
+    watch_connections()
+    try:
+        yield recorder
+    finally:
+        recorder.stop()
+        _current.reset(token)
+
+
+def _timed(method):
+    def wrapper(*args, **kwargs):
+        recorder = _current.get()
+        if recorder is None:
+            return method(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            recorder.serializer_seconds += time.perf_counter() - started
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_serializers():
+    """
+    Times Serializer.is_valid() and .data. Only installed when instrumentation is on,
+    and a no-op outside of a recorded block.
+    """
+    from rest_framework import serializers
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        data = cls.data
+        if not getattr(data.fget, 'instrumented', False):
+            cls.data = property(_timed(data.fget))
+    if not getattr(serializers.BaseSerializer.is_valid, 'instrumented', False):
+        serializers.BaseSerializer.is_valid = _timed(serializers.BaseSerializer.is_valid)
+
+
+def log_if_interesting(recorder, **context):
+    """
+    Logs a structured line when the work was slow or looks like an N+1.
+    """
+    slow = recorder.total_seconds * 1000 >= settings.SLOW_REQUEST_MS
+    repeated = recorder.repeated()
+    if not (slow or repeated):
+        return
+    event = dict(context, event='slow_request' if slow else 'repeated_queries', **recorder.summary())
+    logger.warning(json.dumps(event, default=str))
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Adds Server-Timing to every response and logs slow or N+1 requests.
+    Removes itself from the stack unless settings.QUERY_INSTRUMENTATION is on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        instrument_serializers()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with record() as recorder:
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        with record() as recorder:
+            # The ORM runs on sync_to_async's thread, which has connections of its own
+            await sync_to_async(watch_connections)()
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    def finish(self, request, response, recorder):
+        response['Server-Timing'] = recorder.server_timing()
+        match = request.resolver_match
+        log_if_interesting(
+            recorder,
+            method=request.method,
+            path=request.path,
+            view=match.view_name if match else None,
+            status=response.status_code,
+        )
+        return response
@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import summary
+from .models import Letter
+
+
+def _not_applied(pk, missing):
+    return {"id": pk, "status": "not_found" if pk in missing else "skipped"}
+
+
+def apply_batch(user, create=(), update=(), delete=()):
+    """
+    Applies a batch of letter creates, updates and deletes in one transaction:
+    one INSERT for the creates, one UPDATE per set of changed fields, one DELETE.
+    All or nothing: if any update or delete targets a letter the user doesn't own,
+    nothing is written. Returns (ok, per-item results for create, update and delete).
+    """
+    targets = {item['id'] for item in update} | set(delete)
+
+    with transaction.atomic():
+        # Locked so a concurrent delete can't slip in between the check and the writes
+        owned = set(Letter.objects.select_for_update().filter(user=user, pk__in=targets).values_list('pk', flat=True))
+        missing = targets - owned
+        if missing:
+            return False, {
+                "create": [{"status": "skipped"} for _ in create],
+                "update": [_not_applied(item['id'], missing) for item in update],
+                "delete": [_not_applied(pk, missing) for pk in delete],
+            }
+
+        created = []
+        for data in create:
+            letter = Letter(user=user)
+            for field, value in data.items():
+                setattr(letter, field, value)
+            created.append(letter)
+        Letter.objects.bulk_create(created)
+
+        # bulk_update skips auto_now, so the ETag timestamps are set here
+        now = timezone.now()
+        by_fields = {}
+        for data in update:
+            letter = Letter(pk=data['id'], user=user, updated_at=now)
+            fields = {'updated_at'}
+            for field, value in data.items():
+                if field == 'id':
+                    continue
+                setattr(letter, field, value)
+                # The ciphertext setter writes whichever column the storage mode uses
+                fields.update(('ciphertext', 'ciphertext_raw') if field == 'encoded_ciphertext' else (field,))
+            by_fields.setdefault(frozenset(fields), []).append(letter)
+        for fields, letters in by_fields.items():
+            Letter.objects.bulk_update(letters, sorted(fields))
+
+        if delete:
+            Letter.objects.filter(user=user, pk__in=delete).delete()
+
+    # bulk_create and bulk_update don't send post_save
+    summary.invalidate(user.pk)
+
+    return True, {
+        "create": [{"id": letter.pk, "status": "created", "created_at": letter.created_at} for letter in created],
+        "update": [{"id": item['id'], "status": "updated"} for item in update],
+        "delete": [{"id": pk, "status": "deleted"} for pk in delete],
+    }
@@ -0,0 +1,119 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+
+from api.benchmarking import bench_database, environment, hammer, latency_summary, serve, serve_asgi, write_report
+from api.management.commands.loadbench import Command as LoadBench
+
+ENDPOINTS = {
+    'dashboard': ('/api/dashboard/', '/api/async/dashboard/'),
+    'vault': ('/api/vault/', '/api/async/vault/'),
+    'letters': ('/api/letters/', '/api/async/letters/'),
+    'executor': ('/api/executor/', '/api/async/executor/'),
+}
+# wsgi: the DRF views on a thread per connection; asgi: the same views under uvicorn,
+# each one behind a thread hop; asgi-async: the async views under uvicorn
+MODES = ('wsgi', 'asgi', 'asgi-async')
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database and drives the read endpoints at high concurrency under WSGI, "
+        "under ASGI with the DRF views and under ASGI with the async views. Reports throughput and latency as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500, help='Seeded users (each with a vault and an executor).')
+        parser.add_argument('--letters-per-user', type=int, default=5)
+        parser.add_argument('--vault-kb', type=int, default=8, help='Size of each seeded vault ciphertext.')
+        parser.add_argument('--clients', type=int, default=256, help='Concurrent connections.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and mode.')
+        parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests before each run.')
+        parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+        parser.add_argument('--keep-db', action='store_true', help="Don't drop the benchmark database afterwards.")
+        parser.add_argument('--seed', type=int, default=1234)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['clients'] < 1 or options['requests'] < 1:
+            raise CommandError('--users, --clients and --requests must be at least 1.')
+        if any(mode.startswith('asgi') for mode in options['modes']):
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError('The ASGI modes need uvicorn (pip install uvicorn).')
+
+        random.seed(options['seed'])
+        caches[settings.DASHBOARD_CACHE_ALIAS].clear()
+
+        # Measure the views, not the heartbeat flushes they would trigger
+        with override_settings(HEARTBEAT_ON_REQUEST=False), bench_database(keep=options['keep_db']) as db_name:
+            self.stderr.write(f"Seeding {db_name}...")
+            started = time.perf_counter()
+            fixtures = LoadBench().seed(dict(options, granted_fraction=0))
+            seed_seconds = time.perf_counter() - started
+
+            results = {endpoint: {} for endpoint in options['endpoints']}
+            for mode in options['modes']:
+                with self.server(mode) as (host, port):
+                    for endpoint in options['endpoints']:
+                        self.stderr.write(f"Driving {endpoint} under {mode} with {options['clients']} clients...")
+                        results[endpoint][mode] = self.drive(host, port, mode, endpoint, fixtures, options)
+
+        database = settings.DATABASES['default']
+        report = {
+            "environment": environment(),
+            "scale": {
+                "users": options['users'],
+                "letters_per_user": options['letters_per_user'],
+                "vault_kb": options['vault_kb'],
+                "seed_seconds": round(seed_seconds, 3),
+            },
+            "load": {
+                "clients": options['clients'],
+                "requests_per_run": options['requests'],
+                "warmup": options['warmup'],
+            },
+            "connections": {
+                "pool": database.get('OPTIONS', {}).get('pool'),
+                "conn_max_age": database.get('CONN_MAX_AGE'),
+            },
+            "endpoints": results,
+        }
+        write_report(report, options['output'], self.stdout)
+        if options['output']:
+            self.stderr.write(f"Wrote {options['output']}")
+
+    def server(self, mode):
+        if mode == 'wsgi':
+            return serve(get_wsgi_application())
+        return serve_asgi(get_asgi_application())
+
+    def drive(self, host, port, mode, endpoint, fixtures, options):
+        sync_path, async_path = ENDPOINTS[endpoint]
+        path = async_path if mode == 'asgi-async' else sync_path
+        tokens = fixtures['tokens']
+
+        def requests(count):
+            return [('GET', path, {"Authorization": f"Bearer {random.choice(tokens)}"}) for _ in range(count)]
+
+        if options['warmup']:
+            hammer(host, port, requests(options['warmup']), min(options['clients'], options['warmup']))
+        wall, latencies, statuses = hammer(host, port, requests(options['requests']), options['clients'])
+
+        ok = sum(count for code, count in statuses.items() if code.startswith('2'))
+        return {
+            "requests": options['requests'],
+            "ok": ok,
+            "statuses": statuses,
+            "seconds": round(wall, 3),
+            "throughput_rps": round(options['requests'] / wall, 2),
+            "latency_ms": latency_summary(latencies),
+        }
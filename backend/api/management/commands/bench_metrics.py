@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+from api import metrics
+from api.benchmarking import environment, latency_summary, write_report
+
+
+def _noop(request, status_code, seconds):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measures the per-request cost of the request metrics and the cost of a scrape.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000)
+        parser.add_argument('--views', type=int, default=20,
+                            help='Distinct URL names to spread the requests over (label cardinality).')
+        parser.add_argument('--mode', choices=['both', 'current'], default='both',
+                            help="'both' also reruns itself with PROMETHEUS_MULTIPROC_DIR set.")
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+
+    def handle(self, *args, **options):
+        runs = [self.measure(options)]
+
+        if options['mode'] == 'both' and not metrics.is_multiprocess():
+            # The multiprocess value store is picked when prometheus_client is imported,
+            # so that mode has to be measured in a fresh process
+            with tempfile.TemporaryDirectory(prefix='quackroach-metrics-') as directory:
+                env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+                output = subprocess.run(
+                    [sys.executable, sys.argv[0], 'bench_metrics', '--mode', 'current',
+                     '--iterations', str(options['iterations']), '--views', str(options['views'])],
+                    env=env, capture_output=True, text=True, check=True,
+                ).stdout
+                runs.extend(json.loads(output)['runs'])
+
+        write_report({"environment": environment(), "runs": runs}, options['output'], self.stdout)
+
+    def measure(self, options):
+        requests = [
+            SimpleNamespace(resolver_match=SimpleNamespace(url_name=f"view_{i % options['views']}", view_name=''), method='GET')
+            for i in range(options['iterations'])
+        ]
+
+        # The loop and call overhead is measured with a no-op and subtracted
+        baseline = self.time_loop(_noop, requests)
+        observed = self.time_loop(metrics.observe, requests)
+
+        if metrics.is_multiprocess():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        scrapes = []
+        for _ in range(20):
+            started = time.perf_counter()
+            body = generate_latest(registry)
+            scrapes.append(time.perf_counter() - started)
+
+        return {
+            "mode": 'multiprocess' if metrics.is_multiprocess() else 'single process',
+            "iterations": options['iterations'],
+            "views": options['views'],
+            "observe_ns_per_request": round((observed - baseline) / len(requests) * 1e9, 1),
+            "scrape_ms": latency_summary(scrapes),
+            "scrape_bytes": len(body),
+        }
+
+    def time_loop(self, func, requests):
+        started = time.perf_counter()
+        for request in requests:
+            func(request, 200, 0.01)
+        return time.perf_counter() - started
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password, verify_password
+from django.core.management.base import BaseCommand
+from api.hashing import HashingPool
+
+class Command(BaseCommand):
+    help = 'Measures password verifications (logins) per second per core for the configured hasher.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5,
+                            help='How long to run each pool size.')
+        parser.add_argument('--workers', type=int, nargs='+',
+                            help='Pool sizes to try (default: 1 and PASSWORD_HASH_WORKERS).')
+        parser.add_argument('--iterations', type=int,
+                            help='Override PASSWORD_HASH_ITERATIONS for this run.')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['iterations']:
+            settings.PASSWORD_HASH_ITERATIONS = options['iterations']
+
+        hasher = get_hasher()
+        encoded = make_password('benchmark-password')
+        cores = os.cpu_count() or 1
+        pool_sizes = options['workers'] or sorted({1, settings.PASSWORD_HASH_WORKERS})
+
+        results = []
+        for workers in pool_sizes:
+            # Keep the pool exactly full: one waiting call per thread
+            pool = HashingPool(workers, queue_limit=workers)
+            completed = 0
+            deadline = time.perf_counter() + options['seconds']
+            started = time.perf_counter()
+            pending = [pool.submit(verify_password, 'benchmark-password', encoded) for _ in range(workers * 2)]
+            while pending:
+                pending.pop(0).result()
+                completed += 1
+                if time.perf_counter() < deadline:
+                    pending.append(pool.submit(verify_password, 'benchmark-password', encoded))
+            elapsed = time.perf_counter() - started
+            pool.shutdown()
+
+            per_second = completed / elapsed
+            results.append({
+                "workers": workers,
+                "logins": completed,
+                "seconds": round(elapsed, 3),
+                "logins_per_second": round(per_second, 2),
+                "logins_per_second_per_core": round(per_second / min(workers, cores), 2),
+            })
+
+        report = {
+            "hasher": hasher.algorithm,
+            "iterations": getattr(hasher, 'iterations', None),
+            "cores": cores,
+            "results": results,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report['hasher']} ({report['iterations']} iterations), {cores} cores")
+        for row in results:
+            self.stdout.write(
+                f"  {row['workers']:>3} workers: {row['logins_per_second']:>8} logins/s, "
+                f"{row['logins_per_second_per_core']:>8} logins/s/core"
+            )
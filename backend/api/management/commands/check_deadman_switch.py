@@ -1,50 +1,53 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from django.template.loader import render_to_string
-from django.core.mail import EmailMultiAlternatives
-from django.utils.html import strip_tags
-from datetime import timedelta
-from api.models import Executor
+from api import deadman, instrumentation
 
 class Command(BaseCommand):
     help = 'Checks user inactivity and notifies executors with professional HTML emails.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Executors loaded, emailed and updated per batch.')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Send through a pool of this many threads (each with its own mail connection).')
+        parser.add_argument('--outbox', action='store_true', default=True,
+                            help='Queue the emails for the deliver_outbox worker (the default).')
+        parser.add_argument('--direct', dest='outbox', action='store_false',
+                            help='Send the emails from this process instead. At most once: the executor is marked '
+                                 'notified first, so a crash before the send (or a failed unmark after it) '
+                                 'loses the email.')
+        parser.add_argument('--instrument', action='store_true',
+                            help='Report query count, SQL time and repeated (N+1) queries for the run.')
+
     def handle(self, *args, **options):
-        # 6-month threshold
-        threshold = timezone.now() - timedelta(days=180)
-        
-        # Target Active executors whose users are inactive
-        executors = Executor.objects.filter(
-            user__last_login__lt=threshold,
-            status='Active'
-        )
+        with deadman.recorded_run():
+            if options['instrument']:
+                self.run_instrumented(options)
+            else:
+                self.run(options)
 
-        for executor in executors:
-            subject = f"Security Protocol Initiated: {executor.user.full_name}"
-            
-            # Context for the HTML template
-            context = {
-                'executor_name': executor.name,
-                'user_name': executor.user.full_name,
-                'site_url': 'http://localhost:5173' # Change to your production domain later
-            }
+    def run_instrumented(self, options):
+        with instrumentation.record() as recorder:
+            self.run(options)
+        report = recorder.summary()
+        self.stdout.write(
+            f"{report['queries']} queries, {report['db_ms']} ms in SQL, {report['total_ms']} ms total"
+        )
+        for pattern in report['repeated_sql']:
+            self.stdout.write(self.style.WARNING(f"Repeated {pattern['count']}x: {pattern['sql']}"))
+        instrumentation.log_if_interesting(recorder, command='check_deadman_switch')
 
-            # Render HTML and create plain-text fallback
-            html_content = render_to_string('emails/deadman_notification.html', context)
-            text_content = strip_tags(html_content)
+    def run(self, options):
+        for batch, errors in deadman.process_due(
+            chunk_size=options['chunk_size'], outbox=options['outbox'], workers=options['workers'],
+        ):
+            self.report(batch, errors, options['outbox'])
 
-            msg = EmailMultiAlternatives(
-                subject,
-                text_content,
-                None, # Uses DEFAULT_FROM_EMAIL from settings
-                [executor.email]
-            )
-            msg.attach_alternative(html_content, "text/html")
-            
-            try:
-                msg.send()
-                executor.status = 'Verification_Pending'
-                executor.save()
+    def report(self, batch, errors, outbox):
+        if outbox:
+            self.stdout.write(self.style.SUCCESS(f"Queued {len(batch)} alerts for delivery"))
+            return
+        for executor, error in zip(batch, errors):
+            if error is None:
                 self.stdout.write(self.style.SUCCESS(f"Professional alert sent to {executor.name}"))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Failed to send to {executor.name}: {str(e)}"))
\ No newline at end of file
+            else:
+                self.stdout.write(self.style.ERROR(f"Failed to send to {executor.name}: {str(error)}"))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api import emails
+
+class Command(BaseCommand):
+    help = 'Delivers queued notification emails from the outbox, retrying failures with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Messages claimed and sent per batch.')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Send through a pool of this many threads (each with its own mail connection).')
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='Attempts before a message is marked as failed.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and poll for new messages instead of exiting when the outbox is empty.')
+        parser.add_argument('--interval', type=float, default=10,
+                            help='Seconds to sleep between polls in --loop mode.')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                sent, failed = emails.deliver_due(
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    max_attempts=options['max_attempts'],
+                )
+                if sent or failed:
+                    self.stdout.write(f"Delivered {sent} emails, {failed} failed and will be retried or given up on.")
+
+                # A full batch means there is probably more waiting, so don't sleep
+                if sent + failed == options['batch_size']:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping outbox worker.")
@@ -0,0 +1,217 @@
+import base64
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.utils import timezone
+
+from api.benchmarking import QueryCounter, bench_database, environment, latency_summary, serve, write_report
+from api.models import Executor, Letter, User, Vault
+from api.views import CustomLoginSerializer
+
+ENDPOINTS = ('register', 'login', 'dashboard', 'vault', 'letters', 'legacy-data')
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database, serves the API in-process and drives its main endpoints "
+        "with concurrent clients. Reports throughput, latency percentiles and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500, help='Seeded users (each with a vault and an executor).')
+        parser.add_argument('--letters-per-user', type=int, default=5)
+        parser.add_argument('--vault-kb', type=int, default=8, help='Size of each seeded vault ciphertext.')
+        parser.add_argument('--granted-fraction', type=float, default=0.25,
+                            help='Share of executors seeded as verified with access granted (for legacy-data).')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients per endpoint.')
+        parser.add_argument('--requests', type=int, default=300, help='Requests per endpoint.')
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+        parser.add_argument('--password-iterations', type=int,
+                            help='PBKDF2 iterations for seeded users, login and register (default: the configured cost).')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+        parser.add_argument('--keep-db', action='store_true', help="Don't drop the benchmark database afterwards.")
+        parser.add_argument('--seed', type=int, default=1234)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['clients'] < 1 or options['requests'] < 1:
+            raise CommandError('--users, --clients and --requests must be at least 1.')
+
+        random.seed(options['seed'])
+        if options['password_iterations']:
+            settings.PASSWORD_HASH_ITERATIONS = options['password_iterations']
+        # The benchmark is one client IP hammering unauthenticated endpoints, don't rate limit it
+        settings.API_THROTTLE_RATES = {}
+        for alias in (settings.DASHBOARD_CACHE_ALIAS, settings.THROTTLE_CACHE_ALIAS):
+            caches[alias].clear()
+
+        with bench_database(keep=options['keep_db']) as db_name:
+            self.stderr.write(f"Seeding {db_name}...")
+            started = time.perf_counter()
+            fixtures = self.seed(options)
+            seed_seconds = time.perf_counter() - started
+
+            app = QueryCounter(get_wsgi_application())
+            try:
+                with serve(app) as (host, port):
+                    results = {}
+                    for endpoint in options['endpoints']:
+                        self.stderr.write(f"Driving {endpoint}/ with {options['clients']} clients...")
+                        results[endpoint] = self.drive(host, port, endpoint, fixtures, options, app)
+            finally:
+                app.close()
+
+        report = {
+            "environment": environment(),
+            "scale": {
+                "users": options['users'],
+                "letters_per_user": options['letters_per_user'],
+                "vault_kb": options['vault_kb'],
+                "granted_fraction": options['granted_fraction'],
+                "seed_seconds": round(seed_seconds, 3),
+            },
+            "load": {
+                "clients": options['clients'],
+                "requests_per_endpoint": options['requests'],
+                "password_iterations": settings.PASSWORD_HASH_ITERATIONS,
+            },
+            "endpoints": results,
+        }
+        write_report(report, options['output'], self.stdout)
+        if options['output']:
+            self.stderr.write(f"Wrote {options['output']}")
+
+    def seed(self, options):
+        now = timezone.now()
+        # Every seeded user shares one hash, hashing each would dominate seeding time
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            [
+                User(
+                    email=f"bench{i}@example.com", full_name=f"Bench User {i}", password=password,
+                    last_login=now, next_due_at=now + timedelta(days=180),
+                )
+                for i in range(options['users'])
+            ],
+            batch_size=1000,
+        )
+
+        vault_bytes = options['vault_kb'] * 1024
+        Vault.objects.bulk_create(
+            [
+                Vault(user=user, version=1, item_count=10, iv='iv', salt='salt',
+                      encoded_ciphertext=base64.b64encode(os.urandom(vault_bytes)).decode('ascii'))
+                for user in users
+            ],
+            batch_size=500,
+        )
+
+        letter_body = base64.b64encode(os.urandom(2048)).decode('ascii')
+        Letter.objects.bulk_create(
+            [
+                Letter(user=user, title=f"Letter {n}", recipient=f"Recipient {n}",
+                       encoded_ciphertext=letter_body, iv='iv', salt='salt')
+                for user in users
+                for n in range(options['letters_per_user'])
+            ],
+            batch_size=1000,
+        )
+
+        granted = max(1, int(len(users) * options['granted_fraction']))
+        Executor.objects.bulk_create(
+            [
+                Executor(
+                    user=user, name=f"Executor {i}", email=f"executor{i}@example.com", phone='000',
+                    relationship='Sibling',
+                    status=Executor.Status.ACCESS_GRANTED if i < granted else Executor.Status.ACTIVE,
+                    is_verified=i < granted,
+                )
+                for i, user in enumerate(users)
+            ],
+            batch_size=1000,
+        )
+
+        # Mint tokens up front so authenticated endpoints measure the endpoint, not the login
+        tokens = [str(CustomLoginSerializer.get_token(user).access_token) for user in users]
+        return {
+            "users": users,
+            "tokens": tokens,
+            "granted": [(f"executor{i}@example.com", users[i].email) for i in range(granted)],
+        }
+
+    def build_request(self, endpoint, n, fixtures):
+        """
+        (method, path, body, headers) for the n-th request to an endpoint.
+        """
+        index = random.randrange(len(fixtures['users']))
+        auth = {"Authorization": f"Bearer {fixtures['tokens'][index]}"}
+        if endpoint == 'register':
+            body = {"email": f"new{n}-{random.getrandbits(32)}@example.com", "password": PASSWORD, "full_name": "New User"}
+            return 'POST', '/api/register/', body, {}
+        if endpoint == 'login':
+            return 'POST', '/api/login/', {"email": fixtures['users'][index].email, "password": PASSWORD}, {}
+        if endpoint == 'legacy-data':
+            executor_email, target_email = random.choice(fixtures['granted'])
+            return 'POST', '/api/legacy-data/', {"executor_email": executor_email, "target_email": target_email}, {}
+        path = {'dashboard': '/api/dashboard/', 'vault': '/api/vault/', 'letters': '/api/letters/'}[endpoint]
+        return 'GET', path, None, auth
+
+    def drive(self, host, port, endpoint, fixtures, options, app):
+        requests = [self.build_request(endpoint, n, fixtures) for n in range(options['requests'])]
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def send(request):
+            method, path, body, headers = request
+            headers = dict(headers, **{"X-Bench-Label": endpoint})
+            payload = None
+            if body is not None:
+                payload = json.dumps(body).encode()
+                headers["Content-Type"] = "application/json"
+            conn = http.client.HTTPConnection(host, port, timeout=120)
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                code = response.status
+            except (OSError, http.client.HTTPException):
+                code = 'connection_error'
+            finally:
+                conn.close()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(code)] = statuses.get(str(code), 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as pool:
+            list(pool.map(send, requests))
+        wall = time.perf_counter() - started
+
+        queries = app.counts.get(endpoint, [])
+        ok = sum(count for code, count in statuses.items() if code.startswith('2'))
+        return {
+            "requests": len(requests),
+            "ok": ok,
+            "statuses": statuses,
+            "seconds": round(wall, 3),
+            "throughput_rps": round(len(requests) / wall, 2),
+            "latency_ms": latency_summary(latencies),
+            "queries_per_request": {
+                "mean": round(sum(queries) / len(queries), 2) if queries else None,
+                "max": max(queries) if queries else None,
+            },
+        }
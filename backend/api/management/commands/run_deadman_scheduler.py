@@ -0,0 +1,94 @@
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api import deadman
+
+class Command(BaseCommand):
+    help = (
+        "Runs the dead-man switch as a resident process, checking for due estates every interval. "
+        "Any number of copies can run on different nodes; each claims its own chunks of executors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Seconds between the start of one pass and the next.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Executors claimed, emailed and updated per batch.')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Send through a pool of this many threads (each with its own mail connection).')
+        parser.add_argument('--outbox', action='store_true', default=True,
+                            help='Queue the emails for the deliver_outbox worker (the default).')
+        parser.add_argument('--direct', dest='outbox', action='store_false',
+                            help='Send the emails from this process instead. At most once: the executor is marked '
+                                 'notified first, so a crash before the send (or a failed unmark after it) '
+                                 'loses the email.')
+        parser.add_argument('--passes', type=int, default=0,
+                            help='Stop after this many passes (0 runs until stopped).')
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        previous = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            self.loop(options)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def loop(self, options):
+        started = time.monotonic()
+        passes = 0
+        self.stdout.write(f"Dead-man scheduler running every {options['interval']:g}s.")
+        while not self.stopping.is_set():
+            pass_started = time.monotonic()
+            # Like a request would: drop connections the database has closed or that outlived CONN_MAX_AGE
+            close_old_connections()
+            try:
+                self.run_pass(options)
+            except Exception as e:
+                # Counted in the metrics; a broken pass shouldn't take the scheduler down
+                self.stderr.write(self.style.ERROR(f"Pass failed: {e}"))
+            finally:
+                close_old_connections()
+            passes += 1
+
+            if options['passes'] and passes >= options['passes']:
+                break
+            # Sleeps out the rest of the interval, but wakes straight away on shutdown
+            self.stopping.wait(max(0, options['interval'] - (time.monotonic() - pass_started)))
+
+        self.stdout.write(f"Stopped after {passes} passes in {time.monotonic() - started:.1f}s.")
+
+    def stop(self, signum, frame):
+        # The chunk in flight still commits, the pass ends after it
+        if not self.stopping.is_set():
+            self.stdout.write(f"Received {signal.Signals(signum).name}, finishing the current chunk.")
+        self.stopping.set()
+
+    def run_pass(self, options):
+        started = time.perf_counter()
+        chunks = notified = failed = 0
+        with deadman.recorded_run():
+            chunks_due = deadman.process_due(
+                chunk_size=options['chunk_size'], outbox=options['outbox'], workers=options['workers'],
+            )
+            for batch, errors in chunks_due:
+                chunks += 1
+                errored = sum(1 for error in errors if error is not None)
+                notified += len(batch) - errored
+                failed += errored
+                for executor, error in zip(batch, errors):
+                    if error is not None:
+                        self.stdout.write(self.style.ERROR(f"Failed to send to {executor.name}: {str(error)}"))
+                if self.stopping.is_set():
+                    chunks_due.close()
+                    break
+
+        if chunks or options['verbosity'] > 1:
+            verb = 'queued' if options['outbox'] else 'notified'
+            self.stdout.write(self.style.SUCCESS(
+                f"Pass took {time.perf_counter() - started:.2f}s: {notified} executors {verb}, "
+                f"{failed} failed, {chunks} chunks."
+            ))
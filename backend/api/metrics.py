@@ -0,0 +1,154 @@
+"""
+Prometheus metrics for the API, the dead-man switch and email delivery.
+
+With several worker processes (gunicorn), set PROMETHEUS_MULTIPROC_DIR to an empty,
+writable directory shared by the workers and the cron commands, before they start.
+Every process then writes its samples there and the metrics endpoint adds them up.
+Without it each process only reports its own samples.
+"""
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.models import Count
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+REQUESTS = Counter(
+    'api_requests_total', 'HTTP requests handled, by URL name.',
+    ['view', 'method', 'status'],
+)
+REQUEST_LATENCY = Histogram(
+    'api_request_duration_seconds', 'Time spent handling a request, by URL name.',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+DEADMAN_RUNS = Counter('deadman_runs_total', 'check_deadman_switch runs, by outcome.', ['outcome'])
+DEADMAN_DURATION = Histogram(
+    'deadman_run_duration_seconds', 'Wall time of a check_deadman_switch run.',
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600),
+)
+DEADMAN_NOTIFIED = Counter('deadman_executors_notified_total', 'Executors moved to verification by the dead-man switch.')
+DEADMAN_LAST_SUCCESS = Gauge(
+    'deadman_last_success_timestamp_seconds', 'When check_deadman_switch last finished without errors.',
+    multiprocess_mode='max',
+)
+
+EMAILS = Counter(
+    'email_sends_total', 'Email send attempts, by where they came from and how they went.',
+    ['source', 'outcome'],
+)
+EMAILS_QUEUED = Counter('email_queued_total', 'Emails added to the outbox, by where they came from.', ['source'])
+
+
+def is_multiprocess():
+    return 'PROMETHEUS_MULTIPROC_DIR' in os.environ or 'prometheus_multiproc_dir' in os.environ
+
+
+def record_emails(source, results):
+    """
+    Counts one send per result, where a result is None on success or the error.
+    """
+    failed = sum(1 for error in results if error is not None)
+    if len(results) - failed:
+        EMAILS.labels(source or 'unknown', 'sent').inc(len(results) - failed)
+    if failed:
+        EMAILS.labels(source or 'unknown', 'failed').inc(failed)
+
+
+class ExecutorStatusCollector:
+    """
+    Executors per status, read with one GROUP BY when scraped rather than kept in
+    step with every status change.
+    """
+
+    def collect(self):
+        from .models import Executor
+
+        family = GaugeMetricFamily('executors', 'Executors by status.', labels=['status'])
+        counts = dict(Executor.objects.order_by().values_list('status').annotate(total=Count('pk')))
+        for value, label in Executor.Status.choices:
+            family.add_metric([label], counts.get(value, 0))
+        yield family
+
+
+def render():
+    """
+    The exposition text: this deployment's process metrics (summed over workers in
+    multiprocess mode) followed by the database gauges.
+    """
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    database = CollectorRegistry()
+    database.register(ExecutorStatusCollector())
+    return generate_latest(registry) + generate_latest(database)
+
+
+def metrics_view(request):
+    """
+    Scraped by Prometheus with `Authorization: Bearer <METRICS_TOKEN>`.
+    Without a token configured only staff (admin session) can read it.
+    """
+    token = settings.METRICS_TOKEN
+    supplied = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ').strip()
+    if token:
+        allowed = constant_time_compare(supplied, token)
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and observes their latency, labelled by the URL name the request
+    resolved to (see api/urls.py), so ids in paths never become labels.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        # A sync-only middleware would put every ASGI request behind a thread hop
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        observe(request, response.status_code, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        observe(request, response.status_code, time.perf_counter() - started)
+        return response
+
+
+# Anything else is lumped together so clients can't invent label values
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def observe(request, status_code, seconds):
+    match = request.resolver_match
+    view = (match.url_name or match.view_name) if match else 'unmatched'
+    method = request.method if request.method in METHODS else 'other'
+    REQUESTS.labels(view, method, status_code).inc()
+    REQUEST_LATENCY.labels(view, method).observe(seconds)
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_alter_executor_id_alter_letter_id_alter_user_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vault',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='VaultItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.CharField(max_length=64)),
+                ('ciphertext', models.TextField(blank=True)),
+                ('iv', models.CharField(blank=True, max_length=255)),
+                ('version', models.PositiveBigIntegerField()),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vault_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'version'], name='vault_item_sync_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'item_id'), name='unique_vault_item_per_user')],
+            },
+        ),
+    ]
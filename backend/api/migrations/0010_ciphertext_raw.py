@@ -0,0 +1,28 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_vault_version_vaultitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='letter',
+            name='ciphertext_raw',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vault',
+            name='ciphertext_raw',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='vault',
+            name='ciphertext',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_ciphertext_raw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='letter',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:27
+
+import datetime
+from django.db import migrations, models
+from django.db.models import F
+
+STATUS_CODES = {'Active': '1', 'Verification_Pending': '2', 'Access_Granted': '3'}
+
+
+def backfill_next_due_at(apps, schema_editor):
+    # Only users that ever logged in were reachable by the old last_login scan
+    User = apps.get_model('api', 'User')
+    User.objects.filter(last_login__isnull=False).update(next_due_at=F('last_login') + F('check_in_interval'))
+
+
+def status_to_codes(apps, schema_editor):
+    Executor = apps.get_model('api', 'Executor')
+    for name, code in STATUS_CODES.items():
+        Executor.objects.filter(status=name).update(status=code)
+    # Anything else (e.g. the old 'Pending' default) starts over as Active
+    Executor.objects.exclude(status__in=STATUS_CODES.values()).update(status='1')
+
+
+def codes_to_status(apps, schema_editor):
+    Executor = apps.get_model('api', 'Executor')
+    for name, code in STATUS_CODES.items():
+        Executor.objects.filter(status=code).update(status=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_letter_executor_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='check_in_interval',
+            field=models.DurationField(default=datetime.timedelta(days=180)),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='next_due_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_next_due_at, migrations.RunPython.noop),
+        migrations.RunPython(status_to_codes, codes_to_status),
+        migrations.AlterField(
+            model_name='executor',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Active'), (2, 'Verification_Pending'), (3, 'Access_Granted')], db_index=True, default=1),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='letter',
+            index=models.Index(fields=['user', 'created_at'], name='letter_user_created_idx'),
+        ),
+    ]
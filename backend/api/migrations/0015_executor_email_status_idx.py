@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_letter_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='executor',
+            index=models.Index(fields=['email', 'status'], name='executor_email_status_idx'),
+        ),
+    ]
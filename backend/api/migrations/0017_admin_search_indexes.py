@@ -0,0 +1,48 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:38
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# Columns the admin searches by prefix ('^'), which compiles to UPPER(col::text) LIKE 'ABC%'.
+# A plain btree can't serve LIKE under a non-C collation, so Postgres gets pattern_ops indexes.
+PREFIX_INDEXES = [
+    ('user_full_name_prefix_idx', 'api_user', 'full_name'),
+    ('executor_name_prefix_idx', 'api_executor', 'name'),
+    ('letter_recipient_prefix_idx', 'api_letter', 'recipient'),
+]
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in PREFIX_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" (UPPER("{column}"::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_documentupload'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='executor',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='executor_email_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='user_email_upper_idx'),
+        ),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
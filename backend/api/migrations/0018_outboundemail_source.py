@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='source',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_outboundemail_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='sending_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.11 on 2026-10-17 22:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def split_synced_counts(apps, schema_editor):
+    Vault = apps.get_model('api', 'Vault')
+    VaultItem = apps.get_model('api', 'VaultItem')
+    counts = VaultItem.objects.filter(is_deleted=False).order_by().values('user').annotate(total=Count('pk'))
+    for row in counts:
+        Vault.objects.filter(user_id=row['user']).update(synced_item_count=row['total'])
+    # Vaults only ever written by the delta sync have no upload, so item_count was the sync's
+    synced_users = VaultItem.objects.values('user')
+    Vault.objects.filter(user__in=synced_users, ciphertext='', ciphertext_raw__isnull=True).update(item_count=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_outboundemail_sending_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vault',
+            name='synced_item_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(split_synced_counts, migrations.RunPython.noop),
+    ]
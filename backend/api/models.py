@@ -1,23 +1,47 @@
+import base64
+import uuid
+from datetime import timedelta
+
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Upper
 from django.conf import settings
+from django.utils import timezone
+
+from . import hashing
 
 class UserManager(BaseUserManager):
-    def create_user(self, email, password=None, **extra_fields):
-        """
-        Creates and saves a standard User with the given email and password.
-        """
+    def _build_user(self, email, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
             
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
+        # Signing up starts the first check-in window
+        user.next_due_at = timezone.now() + user.check_in_interval
+        return user
+
+    def create_user(self, email, password=None, **extra_fields):
+        """
+        Creates and saves a standard User with the given email and password.
+        """
+        user = self._build_user(email, **extra_fields)
         
-        # set_password automatically hashes the password securely
-        user.set_password(password) 
+        # Hashed securely, on the bounded hashing pool
+        user.set_password(password)
         user.save(using=self._db)
         return user
 
+    async def acreate_user(self, email, password=None, **extra_fields):
+        """
+        Async create_user: the event loop isn't blocked while the password hashes.
+        """
+        user = self._build_user(email, **extra_fields)
+        await user.aset_password(password)
+        await user.asave(using=self._db)
+        return user
+
     def create_superuser(self, email, password=None, **extra_fields):
         """
         Creates and saves a SuperUser with the given email and password.
@@ -32,6 +56,18 @@ class UserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def record_check_in(self, user_id, when=None):
+        """
+        Marks the user as alive at `when` (default: now) and pushes their dead-man deadline
+        forward by their own interval, in a single UPDATE.
+        """
+        when = when or timezone.now()
+        return self.filter(pk=user_id).update(last_login=when, next_due_at=when + F('check_in_interval'))
+
+    async def arecord_check_in(self, user_id, when=None):
+        when = when or timezone.now()
+        return await self.filter(pk=user_id).aupdate(last_login=when, next_due_at=when + F('check_in_interval'))
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """
@@ -46,6 +82,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(auto_now_add=True)
 
+    # Dead-man switch: how long the user may stay silent, and when that runs out.
+    # next_due_at is precomputed and indexed so the nightly scan is a range query.
+    check_in_interval = models.DurationField(default=timedelta(days=180))
+    next_due_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
     objects = UserManager()
 
     # Tells Django to use 'email' for logging in instead of 'username'
@@ -54,45 +95,218 @@ class User(AbstractBaseUser, PermissionsMixin):
     # Fields required when creating a superuser via the terminal
     REQUIRED_FIELDS = ['full_name'] 
 
+    class Meta:
+        indexes = [
+            # Admin search on '=email' compares UPPER(email), which the unique index can't serve
+            models.Index(Upper('email'), name='user_email_upper_idx'),
+        ]
+
     def __str__(self):
         return f"{self.full_name} ({self.email})"
-    
-class Vault(models.Model):
+
+    # Set on users built from token claims (api/authentication.py), which are missing most fields
+    from_claims = False
+
+    def save(self, *args, **kwargs):
+        if self.from_claims:
+            raise TypeError("This user was built from token claims; load it from the database to save it.")
+        super().save(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        # AbstractBaseUser's, but hashed on the bounded pool. _password makes save()
+        # tell the password validators about the change (password_changed).
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    async def aset_password(self, raw_password):
+        self.password = await hashing.amake_password(raw_password)
+        self._password = raw_password
+
+class CiphertextMixin:
+    """
+    Keeps ciphertext either as base64 text (`ciphertext`) or as raw bytes (`ciphertext_raw`),
+    depending on settings.CIPHERTEXT_STORAGE. Reads understand both, so rows written
+    before switching modes keep working and get converted on their next save.
+    """
+
+    @property
+    def encoded_ciphertext(self):
+        if self.ciphertext_raw is not None:
+            return base64.b64encode(self.ciphertext_raw).decode('ascii')
+        return self.ciphertext
+
+    @encoded_ciphertext.setter
+    def encoded_ciphertext(self, value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            self.set_raw_ciphertext(value)
+        elif value is not None and settings.CIPHERTEXT_STORAGE == 'binary':
+            self.set_raw_ciphertext(base64.b64decode(value))
+        else:
+            self.ciphertext = value
+            self.ciphertext_raw = None
+
+    def set_raw_ciphertext(self, data):
+        if settings.CIPHERTEXT_STORAGE == 'binary':
+            self.ciphertext_raw = data
+            self.ciphertext = ''
+        else:
+            self.ciphertext = base64.b64encode(data).decode('ascii')
+            self.ciphertext_raw = None
+
+
+def encode_ciphertext_row(row):
+    """
+    Same as CiphertextMixin.encoded_ciphertext, for rows fetched with .values().
+    """
+    raw = row.pop('ciphertext_raw', None)
+    if raw is not None:
+        row['ciphertext'] = base64.b64encode(raw).decode('ascii')
+    return row
+
+
+class Vault(CiphertextMixin, models.Model):
     # OneToOne ensures a user can only ever have exactly ONE vault
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    ciphertext = models.TextField()
+    ciphertext = models.TextField(blank=True)
+    # Raw bytes instead of base64 when CIPHERTEXT_STORAGE is 'binary' (about 25% smaller)
+    ciphertext_raw = models.BinaryField(blank=True, null=True)
     iv = models.CharField(max_length=255)
     salt = models.CharField(max_length=255)
+    # Set by the client with each whole-vault upload
     item_count = models.IntegerField(default=0)
+    # Live VaultItems, kept by the delta sync so it never overwrites the upload's count
+    synced_item_count = models.IntegerField(default=0)
+    # Bumped on every change so clients can ask for "everything since version N"
+    version = models.PositiveBigIntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Encrypted Vault for {self.user.email}"
+
+class VaultItem(models.Model):
+    # A single encrypted vault entry, synced on its own so one edit doesn't rewrite the whole vault
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='vault_items')
+    item_id = models.CharField(max_length=64) # Generated by the client
+    ciphertext = models.TextField(blank=True)
+    iv = models.CharField(max_length=255, blank=True)
+    # Vault version at which this entry last changed
+    version = models.PositiveBigIntegerField()
+    # Deleted entries are kept as tombstones so other devices learn about the delete
+    is_deleted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'item_id'], name='unique_vault_item_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'version'], name='vault_item_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"Vault item {self.item_id} for user {self.user_id}"
     
-class Letter(models.Model):
+class Letter(CiphertextMixin, models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     recipient = models.CharField(max_length=255)
     ciphertext = models.TextField(blank=True, null=True)
+    ciphertext_raw = models.BinaryField(blank=True, null=True)
     iv = models.CharField(max_length=255, blank=True, null=True)
     salt = models.CharField(max_length=255, blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Backs the per-user, newest-first letter listing
+            models.Index(fields=['user', 'created_at'], name='letter_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Letter: {self.title} (by {self.user.email})"
 
 class Executor(models.Model):
+    class Status(models.IntegerChoices):
+        ACTIVE = 1, 'Active' # User is alive
+        VERIFICATION_PENDING = 2, 'Verification_Pending' # Dead-man switch triggered
+        ACCESS_GRANTED = 3, 'Access_Granted' # Death confirmed by an admin
+
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     email = models.EmailField()
     phone = models.CharField(max_length=20)
     relationship = models.CharField(max_length=100)
     verification_document = models.FileField(upload_to='verification_docs/', blank=True, null=True)
-    # Statuses: 'Active' (Alive), 'Verification_Pending' (Triggered), 'Access_Granted' (Confirmed)
-    status = models.CharField(max_length=50, default='Active')
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.ACTIVE, db_index=True)
     is_verified = models.BooleanField(default=False) 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Executor-side lookups (document upload, legacy data) filter on email and status
+            models.Index(fields=['email', 'status'], name='executor_email_status_idx'),
+            models.Index(Upper('email'), name='executor_email_upper_idx'),
+        ]
+
+    def __str__(self):
+        return f"Executor {self.name} for {self.user.email}"
+
+class DocumentUpload(models.Model):
+    """
+    A resumable, chunked upload of an executor's verification document.
+    The id doubles as the upload token, the bytes land in a partial file until
+    `offset` reaches `size`, then the file is moved onto the executor.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    executor = models.ForeignKey(Executor, on_delete=models.CASCADE, related_name='document_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size}) for {self.executor.email}"
+
+class OutboundEmail(models.Model):
+    """
+    Outbox row for a notification email. Requests only enqueue these,
+    the deliver_outbox command sends them in batches and retries failures.
+    """
+    class Status(models.IntegerChoices):
+        PENDING = 1, 'Pending'
+        SENT = 2, 'Sent'
+        FAILED = 3, 'Failed' # Gave up after the maximum number of attempts
+
+    subject = models.CharField(max_length=255)
+    to = models.JSONField() # List of recipient addresses
+    body_text = models.TextField()
+    body_html = models.TextField(blank=True)
+    # What queued it ('admin', 'deadman'), used to label the delivery metrics
+    source = models.CharField(max_length=32, blank=True)
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set while a worker is sending it, so nobody else picks it up meanwhile
+    sending_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "what is due" query
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
 
     def __str__(self):
-        return f"Executor {self.name} for {self.user.email}"
\ No newline at end of file
+        return f"{self.subject} -> {', '.join(self.to)}"
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class LetterCursorPagination(CursorPagination):
+    # Cursor paging stays fast on deep pages and doesn't skip rows when letters are added meanwhile
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,66 @@
+import binascii
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser
+
+CHUNK_SIZE = 64 * 1024
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Upload exceeds the maximum allowed size.'
+    default_code = 'payload_too_large'
+
+
+def read_ciphertext(stream, max_bytes, encoded=False):
+    """
+    Reads an upload in fixed-size chunks into a single buffer, decoding base64 on the fly.
+    Stops as soon as the decoded size passes `max_bytes` instead of reading the rest.
+    """
+    buffer = bytearray()
+    leftover = b''
+
+    while True:
+        chunk = stream.read(CHUNK_SIZE) if stream is not None else b''
+        if not chunk:
+            break
+
+        if encoded:
+            # base64 decodes in 4 character groups, so carry the tail over to the next chunk
+            chunk = leftover + b''.join(chunk.split())
+            usable = len(chunk) - len(chunk) % 4
+            leftover = chunk[usable:]
+            try:
+                chunk = binascii.a2b_base64(chunk[:usable], strict_mode=True)
+            except binascii.Error:
+                raise ParseError('Upload is not valid base64.')
+
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise PayloadTooLarge()
+
+    if leftover:
+        raise ParseError('Upload is not valid base64.')
+
+    return buffer
+
+
+class CiphertextParser(BaseParser):
+    """
+    Raw encrypted bytes, written straight into the upload buffer.
+    """
+    media_type = 'application/octet-stream'
+    encoded = False
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return read_ciphertext(stream, settings.VAULT_UPLOAD_MAX_BYTES, encoded=self.encoded)
+
+
+class Base64CiphertextParser(CiphertextParser):
+    """
+    The same ciphertext as a base64 text body, decoded chunk by chunk.
+    """
+    media_type = 'text/plain'
+    encoded = True
@@ -0,0 +1,16 @@
+from rest_framework.permissions import BasePermission
+
+from .models import User
+
+
+class IsStaff(BasePermission):
+    """
+    IsAdminUser, but checked against the database: tokens don't carry is_staff,
+    so a user who is demoted loses access on their next request.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        return User.objects.filter(pk=user.pk, is_staff=True, is_active=True).exists()
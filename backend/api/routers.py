@@ -0,0 +1,296 @@
+"""
+Primary/replica routing (settings.DATABASE_REPLICA_URLS).
+
+Everything goes to the primary unless a view opts in with @read_from_replica
+(or the admin changelists, see admin.py). Inside those, reads go to a replica
+unless:
+- the user wrote something in the last REPLICA_STICKY_SECONDS (read-your-writes),
+- every replica is more than REPLICA_MAX_LAG_SECONDS behind.
+Writes always go to the primary, and any authenticated request that wrote
+pins its user to the primary for the sticky window.
+"""
+import functools
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+logger = logging.getLogger(__name__)
+
+# Per request: the replica its reads go to (None for the primary), and whether anything was written
+_replica_alias = ContextVar('replica_alias', default=None)
+_request_state = ContextVar('replica_request_state', default=None)
+
+_lag = {}
+_lag_lock = threading.Lock()
+_round_robin = itertools.count()
+
+
+def _cache():
+    return caches[settings.REPLICA_CACHE_ALIAS]
+
+
+def _sticky_key(user_id):
+    return f"db:sticky:{user_id}"
+
+
+def _sticky_timeout():
+    # Never shorter than the lag we tolerate, or a lagging replica could still serve the old rows
+    return max(settings.REPLICA_STICKY_SECONDS, settings.REPLICA_MAX_LAG_SECONDS)
+
+
+def pin_to_primary(user_id):
+    try:
+        _cache().set(_sticky_key(user_id), True, _sticky_timeout())
+    except Exception:
+        pass
+
+
+async def apin_to_primary(user_id):
+    try:
+        await _cache().aset(_sticky_key(user_id), True, _sticky_timeout())
+    except Exception:
+        pass
+
+
+def is_pinned(user_id):
+    try:
+        return bool(_cache().get(_sticky_key(user_id)))
+    except Exception:
+        # Can't tell, so play safe
+        return True
+
+
+async def ais_pinned(user_id):
+    try:
+        return bool(await _cache().aget(_sticky_key(user_id)))
+    except Exception:
+        return True
+
+
+def replica_lag(alias):
+    """
+    Seconds the replica is behind, 0 when it can't lag (SQLite, or a Postgres that
+    isn't in recovery, e.g. the primary standing in for a replica locally).
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0"
+            " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+            " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def _is_fresh(alias):
+    """
+    Whether the replica is within REPLICA_MAX_LAG_SECONDS, measured at most once
+    per REPLICA_LAG_CHECK_INTERVAL per process.
+    """
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag.get(alias)
+    if checked is None or now - checked[0] >= settings.REPLICA_LAG_CHECK_INTERVAL:
+        try:
+            lag = replica_lag(alias)
+        except Exception:
+            # Unreachable counts as too far behind until the next check
+            logger.warning("Replica %s lag check failed", alias, exc_info=True)
+            lag = float('inf')
+        checked = (now, lag)
+        with _lag_lock:
+            _lag[alias] = checked
+    return checked[1] <= settings.REPLICA_MAX_LAG_SECONDS
+
+
+def choose_replica():
+    """
+    The next replica that is fresh enough, round robin; None means use the primary.
+    """
+    replicas = settings.REPLICA_DATABASES
+    if not replicas:
+        return None
+    start = next(_round_robin)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if _is_fresh(alias):
+            return alias
+    return None
+
+
+# Caches that each worker keeps to itself, so a pin set by one wouldn't be seen by the others
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches)
+def check_replica_cache(app_configs, **kwargs):
+    if not settings.REPLICA_DATABASES:
+        return []
+    backend = settings.CACHES.get(settings.REPLICA_CACHE_ALIAS, {}).get('BACKEND')
+    if backend in LOCAL_CACHES:
+        return [checks.Error(
+            f"Read replicas need a cache every worker shares, but REPLICA_CACHE_ALIAS "
+            f"'{settings.REPLICA_CACHE_ALIAS}' is a {backend.rsplit('.', 1)[-1]}.",
+            hint="Point REPLICA_CACHE_ALIAS (or CACHE_BACKEND) at Redis, Memcached or the database cache.",
+            id='api.E001',
+        )]
+    return []
+
+
+def _find_request(args):
+    return next((arg for arg in args if isinstance(arg, (Request, HttpRequest))), None)
+
+
+def _may_read_replica(request):
+    return bool(settings.REPLICA_DATABASES) and request is not None and request.method in ('GET', 'HEAD')
+
+
+def _authenticated_user_id(request):
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def _use_replica(alias):
+    # Picked once, so every read in the request sees the same replica
+    return _replica_alias.set(alias) if alias is not None else None
+
+
+def _allow_replica_reads(args):
+    # The token to reset afterwards, or None when this request stays on the primary
+    request = _find_request(args)
+    if not _may_read_replica(request):
+        return None
+    user_id = _authenticated_user_id(request)
+    if user_id is not None and is_pinned(user_id):
+        return None
+    return _use_replica(choose_replica())
+
+
+async def _aallow_replica_reads(args):
+    # Same, but the cache and the lag check (a query) stay off the event loop
+    request = _find_request(args)
+    if not _may_read_replica(request):
+        return None
+    user_id = _authenticated_user_id(request)
+    if user_id is not None and await ais_pinned(user_id):
+        return None
+    return _use_replica(await sync_to_async(choose_replica)())
+
+
+def read_from_replica(view):
+    """
+    Lets the reads of a GET view (function or method, sync or async) go to a
+    replica, once the user is known not to be pinned to the primary.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            # The async ORM copies the context into its thread, so the flag carries over
+            token = await _aallow_replica_reads(args)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                if token is not None:
+                    _replica_alias.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _allow_replica_reads(args)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            if token is not None:
+                _replica_alias.reset(token)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Pins users to the primary for the sticky window after a request of theirs wrote.
+    Removes itself when no replicas are configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        # Under ASGI, stays async so the views below don't run behind a thread hop
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = {'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        self.pin_if_wrote(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = {'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        await self.apin_if_wrote(request, state)
+        return response
+
+    def pin_if_wrote(self, request, state):
+        if state['wrote']:
+            # DRF copies the token-authenticated user onto the underlying request
+            user_id = _authenticated_user_id(request)
+            if user_id is not None:
+                pin_to_primary(user_id)
+
+    async def apin_if_wrote(self, request, state):
+        if state['wrote']:
+            # request.user can still be the lazy session user, which loads from the database
+            user_id = await sync_to_async(_authenticated_user_id)(request)
+            if user_id is not None:
+                await apin_to_primary(user_id)
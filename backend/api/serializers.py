@@ -1,4 +1,7 @@
+import binascii
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from .models import Letter, Vault
 
@@ -21,12 +24,87 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         )
         return user
     
+class CiphertextField(serializers.CharField):
+    """
+    Base64 on the wire. In binary storage mode the value is decoded once here
+    and handed to the model as bytes.
+    """
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if settings.CIPHERTEXT_STORAGE != 'binary':
+            return value
+        try:
+            return binascii.a2b_base64(value, strict_mode=True)
+        except binascii.Error:
+            raise serializers.ValidationError('Ciphertext must be valid base64.')
+
 class VaultSerializer(serializers.ModelSerializer):
+    ciphertext = CiphertextField(source='encoded_ciphertext')
+
     class Meta:
         model = Vault
         fields = ["ciphertext", "iv", "salt","item_count"]
 
+class VaultUploadSerializer(serializers.ModelSerializer):
+    # Metadata for the streaming upload, the ciphertext itself is the request body
+    class Meta:
+        model = Vault
+        fields = ["iv", "salt", "item_count"]
+
+class VaultItemSerializer(serializers.Serializer):
+    # The client owns the item ids, so they come in as plain strings
+    id = serializers.CharField(source='item_id', max_length=64)
+    ciphertext = serializers.CharField()
+    iv = serializers.CharField(max_length=255)
+
+class VaultSyncSerializer(serializers.Serializer):
+    upserts = VaultItemSerializer(many=True, required=False, default=list)
+    deletes = serializers.ListField(child=serializers.CharField(max_length=64), required=False, default=list)
+    salt = serializers.CharField(max_length=255, required=False)
+
 class LetterSerializer(serializers.ModelSerializer):
+    ciphertext = CiphertextField(source='encoded_ciphertext', required=False, allow_null=True, allow_blank=True)
+
+    class Meta:
+        model = Letter
+        fields = ["id", "recipient", "ciphertext", "iv", "salt", "created_at"]
+
+# Per list, so a whole batch stays well under a second of work
+LETTER_BATCH_MAX_ITEMS = 200
+
+class LetterUpdateSerializer(LetterSerializer):
+    id = serializers.IntegerField()
+
+    class Meta(LetterSerializer.Meta):
+        fields = ["id", "recipient", "ciphertext", "iv", "salt"]
+        extra_kwargs = {"recipient": {"required": False}}
+
+class LetterBatchSerializer(serializers.Serializer):
+    create = LetterSerializer(many=True, required=False, default=list, max_length=LETTER_BATCH_MAX_ITEMS)
+    update = LetterUpdateSerializer(many=True, required=False, default=list, max_length=LETTER_BATCH_MAX_ITEMS)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=LETTER_BATCH_MAX_ITEMS)
+
+    def validate(self, attrs):
+        updated = [item['id'] for item in attrs['update']]
+        if len(set(updated)) != len(updated):
+            raise serializers.ValidationError({"update": "Each letter can only be updated once per batch."})
+        if set(updated) & set(attrs['delete']):
+            raise serializers.ValidationError({"delete": "A letter can't be updated and deleted in the same batch."})
+        return attrs
+
+class LetterSummarySerializer(serializers.ModelSerializer):
+    # What the letter list shows, the ciphertext is fetched per letter when it is opened
     class Meta:
         model = Letter
-        fields = ["id", "recipient", "ciphertext", "iv", "salt", "created_at"]
\ No newline at end of file
+        fields = ["id", "title", "recipient", "created_at"]
+
+class CheckInSerializer(serializers.ModelSerializer):
+    # Exposed in days, stored as a duration
+    interval_days = serializers.IntegerField(source='check_in_interval.days', min_value=30, max_value=730)
+    last_check_in = serializers.DateTimeField(source='last_login', read_only=True)
+
+    class Meta:
+        model = User
+        fields = ["interval_days", "last_check_in", "next_due_at"]
+        read_only_fields = ["next_due_at"]
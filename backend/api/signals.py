@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import authentication, summary
+from .models import Executor, Letter, User, Vault
+
+
+@receiver([post_save, post_delete], sender=Vault)
+@receiver([post_save, post_delete], sender=Letter)
+@receiver([post_save, post_delete], sender=Executor)
+def invalidate_owner_summary(sender, instance, **kwargs):
+    summary.invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_summary(sender, instance, **kwargs):
+    # Covers name changes and last_login updates shown on the dashboard
+    summary.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def refresh_cached_auth_user(sender, instance, update_fields=None, **kwargs):
+    # Tokens carry is_active, so deactivation must also reach the auth cache
+    if update_fields is None or 'is_active' in update_fields:
+        authentication.mark_inactive(instance.pk, not instance.is_active)
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_auth_user(sender, instance, **kwargs):
+    authentication.mark_inactive(instance.pk)
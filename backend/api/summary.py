@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Executor, Letter, User
+
+
+def _cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def _key(user_id):
+    return f"dashboard:summary:{user_id}"
+
+
+def get_summary(user_id):
+    """
+    Everything dashboard_stats needs for one user, cached until one of their
+    rows changes (see signals.py).
+    """
+    summary = _cache().get(_key(user_id))
+    if summary is None:
+        summary = load_summary(user_id)
+        _cache().set(_key(user_id), summary, settings.DASHBOARD_CACHE_TIMEOUT)
+    return summary
+
+
+async def aget_summary(user_id):
+    """
+    get_summary for the async views, through the async cache API and the async ORM
+    so a network cache never blocks the event loop.
+    """
+    summary = await _cache().aget(_key(user_id))
+    if summary is None:
+        summary = await summary_query(user_id).afirst()
+        await _cache().aset(_key(user_id), summary, settings.DASHBOARD_CACHE_TIMEOUT)
+    return summary
+
+
+def load_summary(user_id):
+    return summary_query(user_id).first()
+
+
+def summary_query(user_id):
+    """
+    One query: the vault is a LEFT JOIN (never the ciphertext), letters and the executor are subqueries.
+    """
+    letter_count = (
+        Letter.objects.filter(user=OuterRef('pk'))
+        .order_by()
+        .values('user')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return (
+        User.objects.filter(pk=user_id)
+        .annotate(
+            # Whole-vault uploads and delta-synced items are counted separately
+            vault_count=Coalesce(F('vault__item_count') + F('vault__synced_item_count'), 0),
+            letter_count=Coalesce(Subquery(letter_count), 0),
+            has_executor=Exists(Executor.objects.filter(user=OuterRef('pk'))),
+        )
+        .values('full_name', 'email', 'last_login', 'date_joined', 'vault_count', 'letter_count', 'has_executor')
+    )
+
+
+def invalidate(user_id):
+    _cache().delete(_key(user_id))
+
+
+async def ainvalidate(user_id):
+    await _cache().adelete(_key(user_id))
+
+
+def invalidate_many(user_ids):
+    _cache().delete_many([_key(user_id) for user_id in user_ids])
@@ -0,0 +1,101 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Vault, VaultItem
+
+
+def changes_since(user, since=0):
+    """
+    Returns the vault version plus every item that changed after `since`.
+    A client that has never synced (since=0) doesn't need the tombstones.
+    """
+    vault = Vault.objects.filter(user=user).values('version', 'salt').first()
+    if vault is None:
+        return {"version": 0, "salt": None, "items": [], "deleted": []}
+
+    # Capped at the version we just read so a push landing in between is picked up next time
+    changed = VaultItem.objects.filter(
+        user=user, version__gt=since, version__lte=vault['version']
+    ).order_by('version')
+    if since == 0:
+        changed = changed.filter(is_deleted=False)
+
+    items, deleted = [], []
+    for item in changed.values('item_id', 'ciphertext', 'iv', 'version', 'is_deleted'):
+        if item['is_deleted']:
+            deleted.append(item['item_id'])
+        else:
+            items.append({
+                "id": item['item_id'],
+                "ciphertext": item['ciphertext'],
+                "iv": item['iv'],
+                "version": item['version'],
+            })
+
+    return {"version": vault['version'], "salt": vault['salt'], "items": items, "deleted": deleted}
+
+
+def apply_changes(user, upserts=(), deletes=(), salt=None):
+    """
+    Writes only the changed vault items in one transaction and bumps the vault version once.
+    Returns the new version.
+    """
+    deletes = set(deletes)
+    # Last write wins inside a batch, and a delete beats an upsert of the same item
+    latest = {item['item_id']: item for item in upserts if item['item_id'] not in deletes}
+
+    with transaction.atomic():
+        # Locking the vault row serialises concurrent pushes for the same user.
+        # Only the bookkeeping columns are read, never the whole-vault ciphertext.
+        vault, created = Vault.objects.select_for_update().only('user', 'version', 'synced_item_count', 'salt').get_or_create(
+            user=user, defaults={"ciphertext": "", "iv": "", "salt": salt or ""}
+        )
+        version = vault.version + 1
+
+        if latest:
+            VaultItem.objects.bulk_create(
+                [
+                    VaultItem(user=user, item_id=item_id, ciphertext=item['ciphertext'], iv=item['iv'], version=version)
+                    for item_id, item in latest.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'item_id'],
+                update_fields=['ciphertext', 'iv', 'version', 'is_deleted', 'updated_at'],
+            )
+
+        if deletes:
+            VaultItem.objects.filter(user=user, item_id__in=deletes, is_deleted=False).update(
+                ciphertext='', iv='', is_deleted=True, version=version, updated_at=timezone.now()
+            )
+
+        vault.version = version
+        vault.synced_item_count = VaultItem.objects.filter(user=user, is_deleted=False).count()
+        update_fields = ['version', 'synced_item_count', 'updated_at']
+        if salt:
+            vault.salt = salt
+            update_fields.append('salt')
+        vault.save(update_fields=update_fields)
+
+    return version
+
+
+def save_vault(user, values, expected_version):
+    """
+    Replaces the whole encrypted vault, but only if it is still at `expected_version`.
+    That's a single conditional UPDATE, or an INSERT for a first save (version 0).
+    Returns the new version, or None when another save got there first.
+    """
+    values = dict(values, updated_at=timezone.now())
+    if Vault.objects.filter(user=user, version=expected_version).update(version=F('version') + 1, **values):
+        return expected_version + 1
+
+    if expected_version != 0:
+        return None
+    try:
+        with transaction.atomic():
+            Vault.objects.create(user=user, version=1, **values)
+    except IntegrityError:
+        # Someone else created it in the meantime
+        return None
+    return 1
@@ -1,3 +1,1614 @@
-from django.test import TestCase
+"""
+Query budgets for the API views, the admin changelists and the management commands,
+followed by behaviour tests grouped by feature.
 
-# Create your tests here.
+Every budget test runs against 1, 10 and 1000 rows per table and asserts the same number
+of queries each time, so a change that adds a query per row (an N+1) fails here.
+Raising a budget should be a deliberate decision made in the same change.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import shutil
+import tempfile
+import threading
+from contextlib import ExitStack
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+from rest_framework.test import APIClient
+
+from .admin import CustomUserAdmin
+from . import authentication, deadman, documents, emails, hashing, heartbeat, instrumentation, routers, throttling
+from .models import Executor, Letter, OutboundEmail, User, Vault, VaultItem
+from .views import CustomLoginSerializer
+
+PASSWORD = 'budget-password'
+
+# Cheap hashing for the seeded users; login checks against the same cost so no re-hash happens
+TEST_SETTINGS = {
+    'PASSWORD_HASH_ITERATIONS': 1000,
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'METRICS_TOKEN': '',
+    # Tests that want activity tracking turn it on themselves
+    'HEARTBEAT_ENABLED': False,
+    # Budgets are counted on the primary, replica routing has its own tests below
+    'REPLICA_DATABASES': [],
+}
+
+# PDF magic bytes, enough for the upload sniffing
+PDF = b'%PDF-1.4\n' + b'0' * 55
+
+
+class QueryBudgetMixin:
+    rows = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        with override_settings(**TEST_SETTINGS):
+            password = make_password(PASSWORD)
+
+        # The user the API requests are made as: a vault, `rows` vault items and letters,
+        # and an executor who has been granted access (for legacy-data)
+        cls.owner = User.objects.create(
+            email='owner@example.com', full_name='Owner', password=password,
+            last_login=now, next_due_at=now + timedelta(days=180),
+        )
+        Vault.objects.create(user=cls.owner, ciphertext='c' * 64, iv='iv', salt='salt', item_count=cls.rows, version=1)
+        VaultItem.objects.bulk_create([
+            VaultItem(user=cls.owner, item_id=f"item-{n}", ciphertext='c' * 64, iv='iv', version=1)
+            for n in range(cls.rows)
+        ])
+        cls.letters = Letter.objects.bulk_create([
+            Letter(user=cls.owner, title=f"Letter {n}", recipient=f"Recipient {n}", ciphertext='c' * 64, iv='iv', salt='salt')
+            for n in range(cls.rows)
+        ])
+        Executor.objects.create(
+            user=cls.owner, name='Granted', email='granted@example.com', phone='000', relationship='Sibling',
+            status=Executor.Status.ACCESS_GRANTED, is_verified=True,
+        )
+
+        # `rows` other users who missed their check-in, each with a vault and an active executor
+        others = User.objects.bulk_create([
+            User(email=f"user{n}@example.com", full_name=f"User {n}", password=password,
+                 last_login=now - timedelta(days=200), next_due_at=now - timedelta(days=20))
+            for n in range(cls.rows)
+        ])
+        Vault.objects.bulk_create([
+            Vault(user=user, ciphertext='c' * 64, iv='iv', salt='salt', item_count=1, version=1)
+            for user in others
+        ])
+        Executor.objects.bulk_create([
+            Executor(user=user, name=f"Executor {n}", email=f"executor{n}@example.com", phone='000', relationship='Friend')
+            for n, user in enumerate(others)
+        ])
+        OutboundEmail.objects.bulk_create([
+            OutboundEmail(subject=f"Message {n}", to=[f"to{n}@example.com"], body_text='body', source='deadman')
+            for n in range(cls.rows)
+        ])
+
+        # An executor waiting to upload the verification document
+        pending = User.objects.create(email='pending@example.com', full_name='Pending', password=password)
+        Executor.objects.create(
+            user=pending, name='Pending', email='pending-executor@example.com', phone='000', relationship='Parent',
+            status=Executor.Status.VERIFICATION_PENDING,
+        )
+
+        cls.staff = User.objects.create(email='staff@example.com', full_name='Staff', password=password,
+                                        is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=media, DOCUMENT_UPLOAD_TEMP_DIR=f"{media}/partial", **TEST_SETTINGS,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        # Summaries, throttle counters and auth markers from earlier tests would hide queries
+        for alias in caches:
+            caches[alias].clear()
+        authentication.forget(self.owner.pk)
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {CustomLoginSerializer.get_token(self.owner).access_token}")
+        self.anonymous = APIClient()
+
+    def assertStatus(self, response, code):
+        self.assertEqual(response.status_code, code, getattr(response, 'data', None))
+
+    # --- Accounts ---
+
+    def test_register(self):
+        with self.assertNumQueries(2):
+            response = self.anonymous.post('/api/register/', {"email": "new@example.com", "password": PASSWORD, "full_name": "New"}, format='json')
+        self.assertStatus(response, 201)
+
+    def test_login(self):
+        with self.assertNumQueries(2):
+            response = self.anonymous.post('/api/login/', {"email": "owner@example.com", "password": PASSWORD}, format='json')
+        self.assertStatus(response, 200)
+
+    def test_async_register(self):
+        with self.assertNumQueries(2):
+            response = self.anonymous.post('/api/async/register/', {"email": "new@example.com", "password": PASSWORD, "full_name": "New"}, format='json')
+        self.assertStatus(response, 201)
+
+    def test_async_login(self):
+        with self.assertNumQueries(2):
+            response = self.anonymous.post('/api/async/login/', {"email": "owner@example.com", "password": PASSWORD}, format='json')
+        self.assertStatus(response, 200)
+
+    # --- Dashboard and check-in ---
+
+    def test_dashboard(self):
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/dashboard/')
+        self.assertStatus(response, 200)
+        self.assertEqual(response.data['lettersCount'], self.rows)
+
+        # Served from the cache until something changes
+        with self.assertNumQueries(0):
+            self.api.get('/api/dashboard/')
+
+    def test_check_in_get(self):
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/check-in/')
+        self.assertStatus(response, 200)
+
+    def test_check_in_post(self):
+        with self.assertNumQueries(2):
+            response = self.api.post('/api/check-in/')
+        self.assertStatus(response, 200)
+
+    @override_settings(HEARTBEAT_ENABLED=True, HEARTBEAT_RESOLUTION=0, HEARTBEAT_FLUSH_INTERVAL=3600)
+    def test_heartbeat(self):
+        # Requests only note the activity in memory
+        with self.assertNumQueries(0):
+            response = self.api.post('/api/check-in/heartbeat/')
+        self.assertStatus(response, 204)
+
+        # Every overdue user shows up at once: one UPDATE per FLUSH_CHUNK_SIZE users
+        overdue = list(User.objects.filter(next_due_at__lt=timezone.now()).values_list('pk', flat=True))
+        for user_id in overdue:
+            heartbeat.record(user_id)
+        with self.assertNumQueries(math.ceil((len(overdue) + 1) / heartbeat.FLUSH_CHUNK_SIZE)):
+            self.assertEqual(heartbeat.flush(), len(overdue) + 1)
+        self.assertFalse(User.objects.filter(next_due_at__lt=timezone.now()).exists())
+
+        # Late-arriving older activity never moves last_login back
+        last_login = User.objects.values_list('last_login', flat=True).get(pk=self.owner.pk)
+        heartbeat.record(self.owner.pk, when=last_login - timedelta(days=1))
+        heartbeat.flush()
+        self.assertEqual(User.objects.values_list('last_login', flat=True).get(pk=self.owner.pk), last_login)
+
+    @override_settings(HEARTBEAT_ENABLED=True, HEARTBEAT_RESOLUTION=0, HEARTBEAT_FLUSH_INTERVAL=3600)
+    def test_token_refresh(self):
+        refresh = CustomLoginSerializer.get_token(self.owner)
+        with self.assertNumQueries(1):
+            response = self.anonymous.post('/api/token/refresh/', {"refresh": str(refresh)}, format='json')
+        self.assertStatus(response, 200)
+        self.assertEqual(heartbeat.flush(), 1)
+
+    def test_check_in_patch(self):
+        with self.assertNumQueries(2):
+            response = self.api.patch('/api/check-in/', {"interval_days": 90}, format='json')
+        self.assertStatus(response, 200)
+
+    # --- Vault ---
+
+    def test_vault_get(self):
+        with self.assertNumQueries(2):
+            response = self.api.get('/api/vault/')
+        self.assertStatus(response, 200)
+
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/vault/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertStatus(response, 304)
+
+    def test_vault_post(self):
+        with self.assertNumQueries(1):
+            response = self.api.post('/api/vault/', {"ciphertext": "Y2lwaGVy", "iv": "iv", "salt": "salt", "item_count": 1},
+                                     format='json', HTTP_IF_MATCH=f'"{self.owner.pk}-1"')
+        self.assertStatus(response, 200)
+
+    def test_vault_upload(self):
+        with self.assertNumQueries(1):
+            response = self.api.put('/api/vault/upload/?iv=iv&salt=salt&item_count=1', b'ciphertext',
+                                    content_type='application/octet-stream', HTTP_IF_MATCH=f'"{self.owner.pk}-1"')
+        self.assertStatus(response, 200)
+
+    def test_vault_items_get(self):
+        with self.assertNumQueries(2):
+            response = self.api.get('/api/vault/items/?since=0')
+        self.assertStatus(response, 200)
+        self.assertEqual(len(response.data['items']), self.rows)
+
+    def test_vault_items_post(self):
+        upserts = [{"id": f"new-{n}", "ciphertext": "new", "iv": "iv"} for n in range(50)]
+        with self.assertNumQueries(7):
+            response = self.api.post('/api/vault/items/', {"upserts": upserts, "deletes": ["item-0"]}, format='json')
+        self.assertStatus(response, 200)
+
+    def test_vault_item_delete(self):
+        with self.assertNumQueries(7):
+            response = self.api.delete('/api/vault/items/item-0/')
+        self.assertStatus(response, 200)
+
+    # --- Letters ---
+
+    def test_letters_list(self):
+        with self.assertNumQueries(2):
+            response = self.api.get('/api/letters/')
+        self.assertStatus(response, 200)
+
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/letters/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertStatus(response, 304)
+
+    def test_letters_create(self):
+        with self.assertNumQueries(1):
+            response = self.api.post('/api/letters/', {"recipient": "Someone", "ciphertext": "Y2lwaGVy", "iv": "iv", "salt": "salt"}, format='json')
+        self.assertStatus(response, 201)
+
+    def test_letter_detail(self):
+        with self.assertNumQueries(2):
+            response = self.api.get(f'/api/letters/{self.letters[0].pk}/')
+        self.assertStatus(response, 200)
+
+    def test_letters_bulk(self):
+        unwanted = Letter.objects.create(user=self.owner, title='Unwanted', recipient='Nobody')
+        body = {
+            "create": [{"recipient": "New", "ciphertext": "Y2lwaGVy", "iv": "iv", "salt": "salt"}],
+            "update": [{"id": letter.pk, "recipient": "Changed"} for letter in self.letters[:50]],
+            "delete": [unwanted.pk],
+        }
+        with self.assertNumQueries(7):
+            response = self.api.post('/api/letters/bulk/', body, format='json')
+        self.assertStatus(response, 200)
+
+    # --- Executors ---
+
+    def test_executor_get(self):
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/executor/')
+        self.assertStatus(response, 200)
+
+    def test_executor_post(self):
+        with self.assertNumQueries(4):
+            response = self.api.post('/api/executor/', {"name": "New", "email": "new-executor@example.com", "phone": "1", "relationship": "Friend"}, format='json')
+        self.assertStatus(response, 201)
+
+    def test_verify_executor(self):
+        document = SimpleUploadedFile('proof.pdf', PDF, content_type='application/pdf')
+        with self.assertNumQueries(2):
+            response = self.anonymous.post('/api/verify-executor/', {"email": "pending-executor@example.com", "document": document})
+        self.assertStatus(response, 200)
+
+    def test_document_upload(self):
+        with self.assertNumQueries(3):
+            response = self.anonymous.post('/api/verify-executor/uploads/', {
+                "email": "pending-executor@example.com", "filename": "proof.pdf", "content_type": "application/pdf", "size": len(PDF),
+            }, format='json')
+        self.assertStatus(response, 201)
+        location = response['Location']
+
+        with self.assertNumQueries(1):
+            response = self.anonymous.get(location)
+        self.assertStatus(response, 200)
+
+        # The last chunk also moves the file onto the executor
+        with self.assertNumQueries(7):
+            response = self.anonymous.patch(location, PDF, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertStatus(response, 200)
+
+    def test_legacy_data(self):
+        body = {"executor_email": "granted@example.com", "target_email": "owner@example.com"}
+        with self.assertNumQueries(4):
+            response = self.anonymous.post('/api/legacy-data/', body, format='json')
+        self.assertStatus(response, 200)
+        self.assertEqual(len(response.data['letters']), self.rows)
+
+    def test_legacy_data_stream(self):
+        body = {"executor_email": "granted@example.com", "target_email": "owner@example.com"}
+        with self.assertNumQueries(4):
+            response = self.anonymous.post('/api/legacy-data/?stream=1', body, format='json')
+            b''.join(response.streaming_content)
+        self.assertStatus(response, 200)
+
+    # --- Async views (same budgets as the DRF ones) ---
+
+    def test_async_dashboard(self):
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/async/dashboard/')
+        self.assertStatus(response, 200)
+        self.assertEqual(response.json()['lettersCount'], self.rows)
+
+        with self.assertNumQueries(0):
+            self.api.get('/api/async/dashboard/')
+
+    def test_async_vault_get(self):
+        with self.assertNumQueries(2):
+            response = self.api.get('/api/async/vault/')
+        self.assertStatus(response, 200)
+        self.assertEqual(response.json()['item_count'], self.rows)
+
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/async/vault/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertStatus(response, 304)
+
+    def test_async_letters_list(self):
+        with self.assertNumQueries(2):
+            response = self.api.get('/api/async/letters/')
+        self.assertStatus(response, 200)
+        self.assertEqual(len(response.json()['results']), min(self.rows, 20))
+        # The same ETag as the DRF view, so switching between them doesn't refetch
+        self.assertEqual(response['ETag'], self.api.get('/api/letters/')['ETag'])
+
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/async/letters/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertStatus(response, 304)
+
+    def test_async_letter_detail(self):
+        with self.assertNumQueries(2):
+            response = self.api.get(f'/api/async/letters/{self.letters[0].pk}/')
+        self.assertStatus(response, 200)
+
+    def test_async_executor_get(self):
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/async/executor/')
+        self.assertStatus(response, 200)
+        self.assertEqual(response.json()['name'], 'Granted')
+
+    def test_async_views_need_a_token(self):
+        with self.assertNumQueries(0):
+            response = self.anonymous.get('/api/async/vault/')
+        self.assertStatus(response, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+        self.anonymous.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertStatus(self.anonymous.get('/api/async/vault/'), 401)
+
+    def test_async_views_under_asgi(self):
+        # Through the ASGI handler, so the async middleware paths run too
+        token = CustomLoginSerializer.get_token(self.owner).access_token
+        client = AsyncClient()
+        for path in ('/api/async/vault/', '/api/vault/'):
+            response = async_to_sync(client.get)(path, headers={"Authorization": f"Bearer {token}"})
+            self.assertStatus(response, 200)
+            self.assertEqual(response.json()['item_count'], self.rows)
+
+    # --- Ops ---
+
+    def test_ops_stats(self):
+        self.api.force_authenticate(self.staff)
+        # is_staff is checked against the database, tokens don't carry it
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/ops/stats/')
+        self.assertStatus(response, 200)
+
+    def test_ops_metrics(self):
+        self.client.force_login(self.staff)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/ops/metrics/')
+        self.assertStatus(response, 200)
+
+    # --- Admin ---
+
+    def assertChangelistBudget(self, model, budget, query=''):
+        self.client.force_login(self.staff)
+        url = f"/admin/api/{model._meta.model_name}/{query}"
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+        self.assertStatus(response, 200)
+
+    def test_admin_users(self):
+        self.assertChangelistBudget(User, 4)
+        self.assertChangelistBudget(User, 4, '?q=user1@example.com')
+
+    def test_admin_search(self):
+        # Whole emails and name prefixes only, partial emails would need a table scan
+        self.client.force_login(self.staff)
+        user = User.objects.get(email='owner@example.com')
+        for query, found in [('OWNER@example.com', True), ('wner@example.com', False), ('example.com', False)]:
+            response = self.client.get('/admin/api/user/', {'q': query})
+            self.assertEqual(user in response.context['cl'].result_list, found, query)
+        response = self.client.get('/admin/api/user/', {'q': 'Own'})
+        self.assertIn(user, response.context['cl'].result_list)
+        self.assertContains(response, CustomUserAdmin.search_help_text)
+
+    def test_admin_vaults(self):
+        self.assertChangelistBudget(Vault, 4)
+
+    def test_admin_vault_items(self):
+        self.assertChangelistBudget(VaultItem, 4)
+
+    def test_admin_letters(self):
+        self.assertChangelistBudget(Letter, 4)
+        self.assertChangelistBudget(Letter, 4, '?q=Recipient')
+
+    def test_admin_executors(self):
+        self.assertChangelistBudget(Executor, 4)
+
+    def test_admin_outbox(self):
+        # Plus the SELECT DISTINCT behind the source filter
+        self.assertChangelistBudget(OutboundEmail, 5)
+
+    def test_admin_executor_document(self):
+        executor = Executor.objects.get(email='granted@example.com')
+        executor.verification_document.save('proof.pdf', ContentFile(PDF))
+        self.client.force_login(self.staff)
+        # Session, staff user, executor
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/admin/api/executor/{executor.pk}/document/")
+            body = b''.join(response.streaming_content)
+        self.assertStatus(response, 200)
+        self.assertEqual(body, PDF)
+
+    # --- Management commands ---
+
+    def assertDeadmanBudget(self, command, *args):
+        # Per chunk: SAVEPOINT, the locking SELECT, UPDATE, RELEASE (plus the outbox INSERT); sending comes after.
+        # Chunks are kept small enough for SQLite to take each chunk's outbox rows in one INSERT.
+        chunk_size = 50
+        chunks = math.ceil(self.rows / chunk_size)
+        per_chunk = 4 if '--direct' in args else 5
+        # A full last chunk means one more (empty) claim
+        with self.assertNumQueries(per_chunk * chunks + 3 * (self.rows % chunk_size == 0)):
+            call_command(command, '--chunk-size', chunk_size, *args, stdout=StringIO())
+        self.assertEqual(Executor.objects.filter(status=Executor.Status.ACTIVE).count(), 0)
+
+    def test_check_deadman_switch(self):
+        # Queued by default
+        self.assertDeadmanBudget('check_deadman_switch')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.Status.PENDING).count(), 2 * self.rows)
+
+    def test_check_deadman_switch_direct(self):
+        self.assertDeadmanBudget('check_deadman_switch', '--direct')
+        self.assertEqual(len(mail.outbox), self.rows)
+
+    def test_run_deadman_scheduler(self):
+        self.assertDeadmanBudget('run_deadman_scheduler', '--passes', 1)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.Status.PENDING).count(), 2 * self.rows)
+
+    def test_run_deadman_scheduler_direct(self):
+        self.assertDeadmanBudget('run_deadman_scheduler', '--passes', 1, '--direct')
+        self.assertEqual(len(mail.outbox), self.rows)
+
+    def test_deliver_outbox(self):
+        batch_size = 100
+        batches = math.ceil(self.rows / batch_size)
+        # Claim (SAVEPOINT, SELECT, lease UPDATE, RELEASE) then the sent UPDATE per batch;
+        # a full last batch means one more empty look
+        with self.assertNumQueries(5 * batches + 3 * (self.rows % batch_size == 0)):
+            call_command('deliver_outbox', '--batch-size', batch_size, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), self.rows)
+
+
+class QueryBudgetOneRowTests(QueryBudgetMixin, TestCase):
+    rows = 1
+
+
+class QueryBudgetTenRowsTests(QueryBudgetMixin, TestCase):
+    rows = 10
+
+
+class QueryBudgetThousandRowsTests(QueryBudgetMixin, TestCase):
+    rows = 1000
+
+
+class ApiTestCase(TestCase):
+    """
+    One user with a token, TEST_SETTINGS applied and empty caches.
+    """
+
+    def setUp(self):
+        overrides = override_settings(**TEST_SETTINGS)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for alias in caches:
+            caches[alias].clear()
+
+        self.user = User.objects.create(
+            email='user@example.com', full_name='User', password=make_password(PASSWORD),
+            last_login=timezone.now(), next_due_at=timezone.now() + timedelta(days=180),
+        )
+        authentication.forget(self.user.pk)
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {CustomLoginSerializer.get_token(self.user).access_token}")
+        self.anonymous = APIClient()
+
+
+# --- Vault delta sync ---
+
+class VaultSyncTests(ApiTestCase):
+    def push(self, upserts=(), deletes=()):
+        response = self.api.post('/api/vault/items/', {
+            "upserts": [{"id": item_id, "ciphertext": f"c-{item_id}", "iv": "iv"} for item_id in upserts],
+            "deletes": list(deletes),
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['version']
+
+    def pull(self, since):
+        response = self.api.get(f'/api/vault/items/?since={since}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_since(self):
+        first = self.push(upserts=['a', 'b'])
+        second = self.push(upserts=['b', 'c'])
+
+        changes = self.pull(first)
+        self.assertEqual(changes['version'], second)
+        self.assertEqual(sorted(item['id'] for item in changes['items']), ['b', 'c'])
+        self.assertEqual(self.pull(second)['items'], [])
+
+    def test_deletes_are_tombstones(self):
+        first = self.push(upserts=['a', 'b'])
+        self.push(deletes=['a'])
+
+        changes = self.pull(first)
+        self.assertEqual(changes['deleted'], ['a'])
+        self.assertEqual(changes['items'], [])
+        # A fresh device only gets what's alive
+        fresh = self.pull(0)
+        self.assertEqual([item['id'] for item in fresh['items']], ['b'])
+        self.assertEqual(fresh['deleted'], [])
+        self.assertEqual(Vault.objects.get(user=self.user).synced_item_count, 1)
+
+    def test_delete_beats_upsert_in_one_push(self):
+        self.push(upserts=['a'], deletes=['a'])
+        self.assertEqual(self.pull(0)['items'], [])
+
+    def test_since_must_be_a_number(self):
+        self.assertEqual(self.api.get('/api/vault/items/?since=yesterday').status_code, 400)
+
+    def test_upload_count_is_kept(self):
+        response = self.api.post('/api/vault/', {"ciphertext": "aGVsbG8=", "iv": "iv", "salt": "salt", "item_count": 5}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.push(upserts=['a', 'b'])
+        vault = Vault.objects.get(user=self.user)
+        self.assertEqual((vault.item_count, vault.synced_item_count), (5, 2))
+        self.assertEqual(self.api.get('/api/vault/').data['item_count'], 5)
+
+    def test_delete_unknown_item(self):
+        self.assertEqual(self.api.delete('/api/vault/items/missing/').status_code, 404)
+
+# --- Ciphertext storage ---
+
+class CiphertextStorageTests(ApiTestCase):
+    def upload(self, body, content_type='application/octet-stream'):
+        return self.api.put('/api/vault/upload/?iv=iv&salt=salt&item_count=1', body,
+                            content_type=content_type, HTTP_IF_NONE_MATCH='*')
+
+    @override_settings(CIPHERTEXT_STORAGE='binary')
+    def test_binary_mode_stores_raw_bytes(self):
+        self.assertEqual(self.upload(b'\x00\xffsecret').status_code, 200)
+        vault = Vault.objects.get(user=self.user)
+        self.assertEqual(bytes(vault.ciphertext_raw), b'\x00\xffsecret')
+        self.assertEqual(vault.ciphertext, '')
+        # Still base64 on the wire
+        self.assertEqual(self.api.get('/api/vault/').data['ciphertext'], base64.b64encode(b'\x00\xffsecret').decode())
+
+    @override_settings(CIPHERTEXT_STORAGE='binary')
+    def test_base64_upload_is_decoded(self):
+        self.assertEqual(self.upload('aGVs\nbG8=', content_type='text/plain').status_code, 200)
+        self.assertEqual(bytes(Vault.objects.get(user=self.user).ciphertext_raw), b'hello')
+        self.assertEqual(self.upload('not base64!', content_type='text/plain').status_code, 400)
+
+    def test_text_rows_readable_in_binary_mode(self):
+        self.assertEqual(self.upload(b'hello').status_code, 200)
+        self.assertEqual(Vault.objects.get(user=self.user).ciphertext, 'aGVsbG8=')
+        with override_settings(CIPHERTEXT_STORAGE='binary'):
+            self.assertEqual(self.api.get('/api/vault/').data['ciphertext'], 'aGVsbG8=')
+
+    @override_settings(CIPHERTEXT_STORAGE='binary', VAULT_UPLOAD_MAX_BYTES=4)
+    def test_upload_limit(self):
+        self.assertEqual(self.upload(b'hello').status_code, 413)
+
+    @override_settings(CIPHERTEXT_STORAGE='binary')
+    def test_letters_round_trip(self):
+        response = self.api.post('/api/letters/', {"recipient": "Someone", "ciphertext": "aGVsbG8=", "iv": "iv", "salt": "salt"}, format='json')
+        self.assertEqual(response.status_code, 201)
+        letter = Letter.objects.get(user=self.user)
+        self.assertEqual(bytes(letter.ciphertext_raw), b'hello')
+        self.assertEqual(self.api.get(f'/api/letters/{letter.pk}/').data['ciphertext'], 'aGVsbG8=')
+
+
+# --- Dashboard cache ---
+
+class DashboardCacheTests(ApiTestCase):
+    def dashboard(self, queries):
+        with self.assertNumQueries(queries):
+            response = self.api.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assertRefreshed(self, **expected):
+        # One query to rebuild the summary, then cached again
+        data = self.dashboard(1)
+        for key, value in expected.items():
+            self.assertEqual(data[key], value)
+        self.dashboard(0)
+
+    def setUp(self):
+        super().setUp()
+        self.dashboard(1)
+
+    def test_vault(self):
+        vault = Vault.objects.create(user=self.user, ciphertext='c', iv='iv', salt='salt', item_count=3)
+        self.assertRefreshed(vaultItemsCount=3)
+        vault.item_count = 4
+        vault.save()
+        self.assertRefreshed(vaultItemsCount=4)
+        vault.delete()
+        self.assertRefreshed(vaultItemsCount=0)
+
+    def test_letter(self):
+        letter = Letter.objects.create(user=self.user, recipient='Someone', ciphertext='c', iv='iv', salt='salt')
+        self.assertRefreshed(lettersCount=1)
+        letter.recipient = 'Someone else'
+        letter.save()
+        self.dashboard(1)
+        letter.delete()
+        self.assertRefreshed(lettersCount=0)
+
+    def test_executor(self):
+        executor = Executor.objects.create(user=self.user, name='Executor', email='executor@example.com', phone='000', relationship='Sibling')
+        self.assertRefreshed(hasExecutor='Yes')
+        executor.delete()
+        self.assertRefreshed(hasExecutor='No')
+
+    def test_user(self):
+        self.user.full_name = 'Renamed'
+        self.user.save()
+        self.assertRefreshed(fullname='Renamed')
+
+    def test_writes_that_skip_signals(self):
+        # Conditional .update()s and bulk writes send no post_save, the views invalidate themselves
+        self.api.post('/api/vault/', {"ciphertext": "aGVsbG8=", "iv": "iv", "salt": "salt", "item_count": 2}, format='json')
+        self.assertRefreshed(vaultItemsCount=2)
+        self.api.post('/api/vault/items/', {"upserts": [{"id": "a", "ciphertext": "c", "iv": "iv"}]}, format='json')
+        self.assertRefreshed(vaultItemsCount=3)
+        self.api.post('/api/letters/bulk/', {"create": [{"recipient": "Someone", "ciphertext": "bmV3", "iv": "iv", "salt": "salt"}]}, format='json')
+        self.assertRefreshed(lettersCount=1)
+
+    def test_other_users_changes(self):
+        stranger = User.objects.create(email='stranger@example.com', full_name='Stranger')
+        self.dashboard(0)
+        Letter.objects.create(user=stranger, recipient='Someone', ciphertext='c', iv='iv', salt='salt')
+        self.dashboard(0)
+
+
+# --- Notification outbox ---
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP server went away")
+
+
+class LeaseCheckingEmailBackend(BaseEmailBackend):
+    """
+    Records, for each message, whether its row was already leased when it was sent.
+    """
+    leased = []
+
+    def send_messages(self, messages):
+        for message in messages:
+            row = OutboundEmail.objects.get(subject=message.subject)
+            self.leased.append(row.sending_until is not None)
+        return len(messages)
+
+
+class OutboxTests(ApiTestCase):
+    def queue(self, subject='Hello', **fields):
+        return OutboundEmail.objects.create(subject=subject, to=['someone@example.com'], body_text='Hi', **fields)
+
+    def test_retry_delay(self):
+        self.assertEqual([emails.retry_delay(n) for n in (1, 2, 3, 7, 8)],
+                         [timedelta(minutes=m) for m in (1, 2, 4, 60, 60)])
+
+    def test_sent(self):
+        row = self.queue()
+        self.assertEqual(emails.deliver_due(), (1, 0))
+        row.refresh_from_db()
+        self.assertEqual(row.status, OutboundEmail.Status.SENT)
+        self.assertEqual(row.attempts, 1)
+        self.assertIsNone(row.sending_until)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND='api.tests.FailingEmailBackend')
+    def test_failure_backs_off(self):
+        row = self.queue()
+        before = timezone.now()
+        self.assertEqual(emails.deliver_due(), (0, 1))
+        row.refresh_from_db()
+        self.assertEqual(row.status, OutboundEmail.Status.PENDING)
+        self.assertEqual(row.attempts, 1)
+        self.assertIn("went away", row.last_error)
+        self.assertIsNone(row.sending_until)
+        self.assertGreaterEqual(row.next_attempt_at, before + timedelta(minutes=1))
+        # Not due again yet
+        self.assertEqual(emails.deliver_due(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='api.tests.FailingEmailBackend')
+    def test_gives_up_after_max_attempts(self):
+        row = self.queue(attempts=4)
+        emails.deliver_due(max_attempts=5)
+        row.refresh_from_db()
+        self.assertEqual(row.status, OutboundEmail.Status.FAILED)
+        self.assertEqual(row.attempts, 5)
+
+    @override_settings(EMAIL_BACKEND='api.tests.LeaseCheckingEmailBackend')
+    def test_claimed_before_sending(self):
+        LeaseCheckingEmailBackend.leased = []
+        self.queue('One')
+        self.queue('Two')
+        self.assertEqual(emails.deliver_due(), (2, 0))
+        self.assertEqual(LeaseCheckingEmailBackend.leased, [True, True])
+
+    def test_lease(self):
+        self.queue()
+        self.assertEqual(len(emails.claim_due()), 1)
+        # Another worker doesn't get it while the lease runs...
+        self.assertEqual(emails.claim_due(), [])
+        # ...but does once it has run out, e.g. the first worker died mid-batch
+        later = timezone.now() + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS + 1)
+        self.assertEqual(len(emails.claim_due(now=later)), 1)
+
+
+# --- Rate limiting ---
+
+@override_settings(API_THROTTLE_RATES={'login': '2/min'})
+class ThrottleTests(ApiTestCase):
+    def login(self, email='user@example.com', **extra):
+        return self.anonymous.post('/api/login/', {"email": email, "password": "wrong"}, format='json', **extra)
+
+    def test_429_with_retry_after(self):
+        self.assertEqual(self.login().status_code, 401)
+        self.assertEqual(self.login().status_code, 401)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_per_email(self):
+        self.login(REMOTE_ADDR='10.0.0.1')
+        self.login(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(self.login(REMOTE_ADDR='10.0.0.3').status_code, 429)
+        # Other accounts aren't affected
+        self.assertEqual(self.login('other@example.com', REMOTE_ADDR='10.0.0.3').status_code, 401)
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        for n in range(2):
+            self.login(f'user{n}@example.com', HTTP_X_FORWARDED_FOR=f'10.0.0.{n}')
+        response = self.login('user9@example.com', HTTP_X_FORWARDED_FOR='10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_forwarded_for_behind_a_proxy(self):
+        for n in range(2):
+            self.login(f'user{n}@example.com', HTTP_X_FORWARDED_FOR='10.0.0.1')
+        self.assertEqual(self.login('user9@example.com', HTTP_X_FORWARDED_FOR='10.0.0.1').status_code, 429)
+        self.assertEqual(self.login('user9@example.com', HTTP_X_FORWARDED_FOR='10.0.0.2').status_code, 401)
+
+    def test_token_route_is_throttled_too(self):
+        for _ in range(2):
+            self.assertEqual(self.anonymous.post('/api/token/', {"email": self.user.email, "password": "wrong"}, format='json').status_code, 401)
+        self.assertEqual(self.anonymous.post('/api/token/', {"email": self.user.email, "password": "wrong"}, format='json').status_code, 429)
+        # Both routes share the login limits
+        self.assertEqual(self.login().status_code, 429)
+
+    @override_settings(API_THROTTLE_RATES={'login': '0/min'})
+    def test_zero_rate_blocks(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(throttling._take_slot('z', 0, 60, 600), (False, 60))
+
+    def test_local_fallback(self):
+        with mock.patch.object(throttling, '_cache', side_effect=ConnectionError):
+            self.assertEqual(throttling._take_slot('l', 1, 60, 600), (True, 0))
+            self.assertFalse(throttling._take_slot('l', 1, 60, 601)[0])
+            self.assertEqual(throttling._take_slot('l', 1, 60, 720), (True, 0))
+
+    def test_sliding_window(self):
+        start = 600
+        self.assertEqual(throttling._take_slot('t', 2, 60, start), (True, 0))
+        self.assertEqual(throttling._take_slot('t', 2, 60, start + 1), (True, 0))
+        allowed, wait = throttling._take_slot('t', 2, 60, start + 2)
+        self.assertFalse(allowed)
+        self.assertGreater(wait, 58)
+        # Half way into the next window only half the old count is left
+        self.assertEqual(throttling._take_slot('t', 2, 60, start + 90), (True, 0))
+        self.assertFalse(throttling._take_slot('t', 2, 60, start + 91)[0])
+        self.assertEqual(throttling._take_slot('t', 2, 60, start + 120), (True, 0))
+
+
+# --- Token claims and deactivation ---
+
+class ClaimsAuthenticationTests(ApiTestCase):
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.api.get('/api/dashboard/').status_code, 200)
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.api.get('/api/dashboard/').status_code, 401)
+        self.assertEqual(self.api.get('/api/async/dashboard/').status_code, 401)
+
+        self.user.is_active = True
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.api.get('/api/dashboard/').status_code, 200)
+
+    def test_deactivation_reaches_other_workers(self):
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        # Another worker has no entry of its own, only the shared marker to go on
+        authentication.forget(self.user.pk)
+        self.assertEqual(self.api.get('/api/dashboard/').status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.user.delete()
+        self.assertEqual(self.api.get('/api/dashboard/').status_code, 401)
+
+    def test_token_has_no_staff_claim(self):
+        self.assertNotIn('is_staff', CustomLoginSerializer.get_token(self.user).access_token.payload)
+
+    def authenticate(self):
+        token = CustomLoginSerializer.get_token(self.user).access_token
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {token}")
+        return authentication.ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_claims_user_cannot_be_saved(self):
+        user = self.authenticate()
+        self.assertEqual(user.email, self.user.email)
+        with self.assertRaises(TypeError):
+            user.save()
+        with self.assertRaises(TypeError):
+            async_to_sync(user.asave)()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password(PASSWORD))
+
+    def test_each_request_gets_its_own_user(self):
+        first = self.authenticate()
+        first.full_name = 'Changed by a view'
+        second = self.authenticate()
+        self.assertIsNot(first, second)
+        self.assertEqual(second.full_name, 'User')
+
+    def test_demoted_staff_loses_access(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.api.get('/api/ops/stats/').status_code, 200)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.api.get('/api/ops/stats/').status_code, 403)
+
+
+# --- Password hashing pool ---
+
+class HashingPoolTests(ApiTestCase):
+    def test_full_pool_rejects(self):
+        pool = hashing.HashingPool(workers=1, queue_limit=0)
+        self.addCleanup(pool.shutdown)
+        release = threading.Event()
+        running = pool.submit(release.wait)
+        with self.assertRaises(hashing.HashingBusy):
+            pool.submit(len, 'x')
+        self.assertEqual(pool.stats()['rejected'], 1)
+        release.set()
+        running.result()
+        self.assertEqual(pool.run(len, 'x'), 1)
+
+    @mock.patch('django.contrib.auth.password_validation.password_changed')
+    def test_new_passwords_reach_the_validators(self, password_changed):
+        user = User.objects.create_user('sync@example.com', 'a-long-password-1', full_name='Sync')
+        password_changed.assert_called_once_with('a-long-password-1', user)
+        self.assertTrue(user.check_password('a-long-password-1'))
+
+        password_changed.reset_mock()
+        user = async_to_sync(User.objects.acreate_user)('async@example.com', 'a-long-password-2', full_name='Async')
+        password_changed.assert_called_once_with('a-long-password-2', user)
+
+    def assertBusy(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @mock.patch.object(hashing.HashingPool, 'submit', side_effect=hashing.HashingBusy)
+    def test_login_503_when_busy(self, submit):
+        body = {"email": self.user.email, "password": PASSWORD}
+        self.assertBusy(self.anonymous.post('/api/login/', body, format='json'))
+        self.assertBusy(self.anonymous.post('/api/async/login/', body, format='json'))
+
+    @mock.patch.object(hashing.HashingPool, 'submit', side_effect=hashing.HashingBusy)
+    def test_register_503_when_busy(self, submit):
+        body = {"email": "new@example.com", "full_name": "New", "password": "a-long-password-1"}
+        self.assertBusy(self.anonymous.post('/api/async/register/', body, format='json'))
+        self.assertFalse(User.objects.filter(email="new@example.com").exists())
+
+
+# --- Resumable document uploads ---
+
+class DocumentUploadTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media, DOCUMENT_UPLOAD_TEMP_DIR=f"{media}/partial")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.executor = Executor.objects.create(
+            user=self.user, name='Executor', email='executor@example.com', phone='000', relationship='Sibling',
+            status=Executor.Status.VERIFICATION_PENDING,
+        )
+
+    def start(self, content_type='application/pdf', size=len(PDF)):
+        response = self.anonymous.post('/api/verify-executor/uploads/', {
+            "email": self.executor.email, "filename": "proof.pdf", "content_type": content_type, "size": size,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response['Location']
+
+    def send(self, location, chunk, offset):
+        return self.anonymous.patch(location, chunk, content_type='application/offset+octet-stream',
+                                    HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_resume(self):
+        location = self.start()
+        response = self.send(location, PDF[:20], 0)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '20')
+
+        # After a dropped connection the client asks where to carry on from
+        self.assertEqual(self.anonymous.get(location).data['offset'], 20)
+        response = self.send(location, PDF[20:], 20)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['complete'])
+        self.assertEqual(response.data['sha256'], hashlib.sha256(PDF).hexdigest())
+
+        self.executor.refresh_from_db()
+        with self.executor.verification_document.open('rb') as document:
+            self.assertEqual(document.read(), PDF)
+
+    def test_offset_conflict(self):
+        location = self.start()
+        self.send(location, PDF[:20], 0)
+        response = self.send(location, PDF[10:20], 10)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 20)
+
+    def test_signature_rejected(self):
+        location = self.start()
+        response = self.send(location, b'<html><script>' + b'0' * 50, 0)
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.anonymous.get(location).data['offset'], 0)
+
+    def test_unsupported_type(self):
+        response = self.anonymous.post('/api/verify-executor/uploads/', {
+            "email": self.executor.email, "filename": "proof.html", "content_type": "text/html", "size": 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 415)
+
+    def test_empty_chunk(self):
+        location = self.start()
+        response = self.send(location, b'', 0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "Empty chunk.")
+
+
+# --- Vault save conflicts ---
+
+class VaultSaveTests(ApiTestCase):
+    def save(self, ciphertext='aGVsbG8=', **extra):
+        return self.api.post('/api/vault/', {"ciphertext": ciphertext, "iv": "iv", "salt": "salt", "item_count": 1},
+                             format='json', **extra)
+
+    def test_version_conflict(self):
+        first = self.save(HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertEqual(self.save(HTTP_IF_MATCH=etag).status_code, 200)
+
+        # Another device saved since this one loaded the vault
+        response = self.save('c3RhbGU=', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['version'], 2)
+        self.assertEqual(Vault.objects.get(user=self.user).encoded_ciphertext, 'aGVsbG8=')
+
+    def test_create_only_once(self):
+        self.assertEqual(self.save(HTTP_IF_NONE_MATCH='*').status_code, 200)
+        self.assertEqual(self.save(HTTP_IF_NONE_MATCH='*').status_code, 409)
+
+    @override_settings(CIPHERTEXT_STORAGE='binary')
+    def test_binary_mode_response(self):
+        response = self.save()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ciphertext'], 'aGVsbG8=')
+        self.assertEqual(response.data['version'], 1)
+        self.assertEqual(bytes(Vault.objects.get(user=self.user).ciphertext_raw), b'hello')
+
+
+# --- Legacy data streaming ---
+
+class LegacyDataStreamTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        Executor.objects.create(
+            user=self.user, name='Executor', email='executor@example.com', phone='000', relationship='Sibling',
+            status=Executor.Status.ACCESS_GRANTED, is_verified=True,
+        )
+        Letter.objects.bulk_create(
+            Letter(user=self.user, recipient=f"Recipient {n}", ciphertext='Y2lwaGVy', iv='iv', salt='salt') for n in range(250)
+        )
+        self.body = {"executor_email": "executor@example.com", "target_email": self.user.email}
+
+    def test_wsgi(self):
+        response = self.anonymous.post('/api/legacy-data/?stream=1', self.body, format='json')
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))['letters']), 250)
+
+    def test_asgi_streams_asynchronously(self):
+        async def fetch():
+            response = await AsyncClient().post('/api/legacy-data/?stream=1', self.body, content_type='application/json')
+            return response, [part async for part in response.streaming_content]
+
+        response, parts = async_to_sync(fetch)()
+        self.assertEqual(response.status_code, 200)
+        # An async iterator, so Django doesn't buffer it all first
+        self.assertTrue(response.is_async)
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(len(json.loads(b''.join(parts))['letters']), 250)
+
+
+# --- Bulk letters ---
+
+class LetterBatchTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.kept, self.doomed = Letter.objects.bulk_create(
+            Letter(user=self.user, recipient=name, ciphertext='b2xk', iv='iv', salt='salt') for name in ('Kept', 'Doomed')
+        )
+        stranger = User.objects.create(email='stranger@example.com', full_name='Stranger')
+        self.theirs = Letter.objects.create(user=stranger, recipient='Theirs', ciphertext='b2xk', iv='iv', salt='salt')
+
+    def batch(self, **body):
+        return self.api.post('/api/letters/bulk/', body, format='json')
+
+    def new(self, recipient):
+        return {"recipient": recipient, "ciphertext": "bmV3", "iv": "iv", "salt": "salt"}
+
+    def test_applied_together(self):
+        response = self.batch(
+            create=[self.new('One'), self.new('Two')],
+            update=[{"id": self.kept.pk, "ciphertext": "bmV3"}],
+            delete=[self.doomed.pk],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status'] for item in response.data['create']], ['created', 'created'])
+        self.assertEqual(response.data['update'], [{"id": self.kept.pk, "status": "updated"}])
+        self.assertEqual(response.data['delete'], [{"id": self.doomed.pk, "status": "deleted"}])
+        self.assertEqual(sorted(Letter.objects.filter(user=self.user).values_list('recipient', flat=True)), ['Kept', 'One', 'Two'])
+        self.kept.refresh_from_db()
+        self.assertEqual(self.kept.encoded_ciphertext, 'bmV3')
+
+    def test_someone_elses_letter_rolls_back(self):
+        response = self.batch(
+            create=[self.new('One')],
+            update=[{"id": self.theirs.pk, "ciphertext": "bmV3"}],
+            delete=[self.doomed.pk],
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['create'], [{"status": "skipped"}])
+        self.assertEqual(response.data['update'], [{"id": self.theirs.pk, "status": "not_found"}])
+        self.assertEqual(response.data['delete'], [{"id": self.doomed.pk, "status": "skipped"}])
+        # Nothing was written
+        self.assertEqual(Letter.objects.filter(user=self.user).count(), 2)
+        self.theirs.refresh_from_db()
+        self.assertEqual(self.theirs.encoded_ciphertext, 'b2xk')
+
+    def test_invalid_item_writes_nothing(self):
+        response = self.batch(create=[self.new('One'), {"ciphertext": "bm8gcmVjaXBpZW50"}], delete=[self.doomed.pk])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Letter.objects.filter(user=self.user).count(), 2)
+
+    def test_update_and_delete_same_letter(self):
+        response = self.batch(update=[{"id": self.kept.pk, "ciphertext": "bmV3"}], delete=[self.kept.pk])
+        self.assertEqual(response.status_code, 400)
+
+
+# --- Metrics ---
+
+class MetricsTests(ApiTestCase):
+    def scrape(self, token='secret'):
+        with override_settings(METRICS_TOKEN='secret'):
+            return self.anonymous.get('/api/ops/metrics/', HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_needs_the_token(self):
+        self.assertEqual(self.scrape('wrong').status_code, 403)
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE_LATEST)
+
+    def test_requests_by_url_name(self):
+        before = self.sample('api_requests_total', view='dashboard_stats', method='GET', status='200')
+        self.api.get('/api/dashboard/')
+        self.assertEqual(self.sample('api_requests_total', view='dashboard_stats', method='GET', status='200'), before + 1)
+        self.assertIn(b'api_request_duration_seconds_bucket{le="0.005",method="GET",view="dashboard_stats"}', self.scrape().content)
+
+    def test_executors_by_status(self):
+        Executor.objects.create(
+            user=self.user, name='Executor', email='executor@example.com', phone='000', relationship='Sibling',
+            status=Executor.Status.VERIFICATION_PENDING,
+        )
+        body = self.scrape().content
+        self.assertIn(b'executors{status="Verification_Pending"} 1.0', body)
+        self.assertIn(b'executors{status="Access_Granted"} 0.0', body)
+
+    def test_email_outcomes(self):
+        before = self.sample('email_sends_total', source='admin', outcome='sent')
+        queued = self.sample('email_queued_total', source='admin')
+        emails.enqueue([mail.EmailMessage('Hello', 'Hi', None, ['someone@example.com'])], source='admin')
+        emails.deliver_due()
+        self.assertEqual(self.sample('email_queued_total', source='admin'), queued + 1)
+        self.assertEqual(self.sample('email_sends_total', source='admin', outcome='sent'), before + 1)
+
+
+# --- Dead-man switch ---
+
+class StatusCheckingEmailBackend(BaseEmailBackend):
+    """
+    Records the executor's status at the moment its email is sent.
+    """
+    statuses = []
+
+    def send_messages(self, messages):
+        for message in messages:
+            self.statuses.append(Executor.objects.get(email=message.to[0]).status)
+        return len(messages)
+
+
+class DeadmanTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(next_due_at=timezone.now() - timedelta(days=1))
+        self.executor = Executor.objects.create(
+            user=self.user, name='Executor', email='executor@example.com', phone='000', relationship='Sibling',
+        )
+
+    def run_pass(self):
+        return list(deadman.process_due())
+
+    def test_notifies_once(self):
+        [(batch, errors)] = self.run_pass()
+        self.assertEqual(errors, [None])
+        self.executor.refresh_from_db()
+        self.assertEqual(self.executor.status, Executor.Status.VERIFICATION_PENDING)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.run_pass(), [])
+
+    @override_settings(EMAIL_BACKEND='api.tests.StatusCheckingEmailBackend')
+    def test_status_committed_before_sending(self):
+        StatusCheckingEmailBackend.statuses = []
+        self.run_pass()
+        self.assertEqual(StatusCheckingEmailBackend.statuses, [Executor.Status.VERIFICATION_PENDING])
+
+    @override_settings(EMAIL_BACKEND='api.tests.FailingEmailBackend')
+    def test_failed_send_is_retried_next_pass(self):
+        [(batch, errors)] = self.run_pass()
+        self.assertIsInstance(errors[0], ConnectionError)
+        self.executor.refresh_from_db()
+        self.assertEqual(self.executor.status, Executor.Status.ACTIVE)
+
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            [(batch, errors)] = self.run_pass()
+        self.assertEqual(errors, [None])
+        self.executor.refresh_from_db()
+        self.assertEqual(self.executor.status, Executor.Status.VERIFICATION_PENDING)
+
+    def test_outbox(self):
+        list(deadman.process_due(outbox=True))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(source='deadman').count(), 1)
+        self.executor.refresh_from_db()
+        self.assertEqual(self.executor.status, Executor.Status.VERIFICATION_PENDING)
+
+
+# --- Activity heartbeat ---
+
+class HeartbeatTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # After ApiTestCase's TEST_SETTINGS, which turn the heartbeat off
+        overrides = override_settings(HEARTBEAT_ENABLED=True, HEARTBEAT_RESOLUTION=0, HEARTBEAT_FLUSH_INTERVAL=3600)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        heartbeat.flush()
+
+    def test_requests_are_not_check_ins_by_default(self):
+        self.assertEqual(self.api.get('/api/dashboard/').status_code, 200)
+        self.assertEqual(heartbeat.flush(), 0)
+
+    def test_requests_as_check_ins(self):
+        with override_settings(HEARTBEAT_ON_REQUEST=True):
+            self.assertEqual(self.api.get('/api/dashboard/').status_code, 200)
+            self.assertEqual(self.api.get('/api/async/dashboard/').status_code, 200)
+        self.assertEqual(heartbeat.flush(), 1)
+
+
+# --- Query instrumentation ---
+
+class InstrumentationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # Quiet by default, tests lower the thresholds they want to trip
+        overrides = override_settings(QUERY_INSTRUMENTATION=True, SLOW_REQUEST_MS=60000, N_PLUS_ONE_THRESHOLD=100)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def server_timing(self, response):
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, view;dur=[\d.]+$')
+        return int(timing.split('"')[1].split()[0])
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.api.get('/api/dashboard/')
+        self.assertEqual(self.server_timing(response), len(queries))
+
+    def test_server_timing_async(self):
+        # The async ORM runs on another thread than the middleware, start with its connection unhooked
+        connection = connections['default']
+        if instrumentation._dispatch in connection.execute_wrappers:
+            connection.execute_wrappers.remove(instrumentation._dispatch)
+        token = CustomLoginSerializer.get_token(self.user).access_token
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(AsyncClient().get)(
+                '/api/async/dashboard/', headers={"Authorization": f"Bearer {token}"},
+            )
+        self.assertGreater(len(queries), 0)
+        self.assertEqual(self.server_timing(response), len(queries))
+
+    def test_off_switch(self):
+        with override_settings(QUERY_INSTRUMENTATION=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                instrumentation.QueryInstrumentationMiddleware(lambda request: None)
+            self.assertNotIn('Server-Timing', self.api.get('/api/dashboard/').headers)
+
+    def test_sql_pattern(self):
+        self.assertEqual(
+            instrumentation.sql_pattern('SELECT "id"\n  FROM "api_letter" WHERE "user_id" IN (%s, %s,%s) LIMIT 21'),
+            'SELECT "id" FROM "api_letter" WHERE "user_id" IN (...) LIMIT N',
+        )
+        self.assertEqual(
+            instrumentation.sql_pattern('SELECT 1 FROM t WHERE id IN (%s)'),
+            instrumentation.sql_pattern('SELECT 2 FROM t WHERE id IN (%s, %s)'),
+        )
+
+    def test_quiet_requests_not_logged(self):
+        with self.assertNoLogs('api.instrumentation'):
+            self.api.get('/api/dashboard/')
+
+    def test_slow_request_logged(self):
+        with override_settings(SLOW_REQUEST_MS=0), self.assertLogs('api.instrumentation', 'WARNING') as logs:
+            self.api.get('/api/dashboard/')
+        [event] = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual(event['event'], 'slow_request')
+        self.assertEqual((event['method'], event['path'], event['view'], event['status']),
+                         ('GET', '/api/dashboard/', 'dashboard_stats', 200))
+        self.assertGreater(event['queries'], 0)
+
+    def test_repeated_sql_logged(self):
+        with override_settings(N_PLUS_ONE_THRESHOLD=3), self.assertLogs('api.instrumentation', 'WARNING') as logs:
+            with instrumentation.record() as recorder:
+                for pk in range(3):
+                    list(Letter.objects.filter(pk=pk))
+            instrumentation.log_if_interesting(recorder, command='test')
+        self.assertEqual(recorder.query_count, 3)
+        event = json.loads(logs.records[0].getMessage())
+        self.assertEqual(event['event'], 'repeated_queries')
+        [repeated] = event['repeated_sql']
+        self.assertEqual(repeated['count'], 3)
+        self.assertTrue(repeated['sql'].endswith('WHERE "api_letter"."id" = %s'))
+
+    def test_command_instrument(self):
+        User.objects.filter(pk=self.user.pk).update(next_due_at=timezone.now() - timedelta(days=1))
+        Executor.objects.create(user=self.user, name='Executor', email='executor@example.com', phone='000',
+                                relationship='Sibling')
+        out = StringIO()
+        with override_settings(N_PLUS_ONE_THRESHOLD=1), self.assertLogs('api.instrumentation', 'WARNING'):
+            call_command('check_deadman_switch', '--instrument', stdout=out)
+        self.assertRegex(out.getvalue(), r'\d+ queries, [\d.]+ ms in SQL, [\d.]+ ms total')
+        self.assertIn('Repeated 1x: ', out.getvalue())
+        self.assertEqual(OutboundEmail.objects.filter(source='deadman').count(), 1)
+
+
+# --- Replica routing ---
+
+class ReplicaRouterTests(SimpleTestCase):
+    @override_settings(REPLICA_DATABASES=['replica_1'])
+    def test_replica_chosen_once_per_request(self):
+        router = routers.PrimaryReplicaRouter()
+
+        @routers.read_from_replica
+        def view(request):
+            return [router.db_for_read(User) for _ in range(3)]
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        with mock.patch('api.routers.choose_replica', return_value='replica_1') as choose:
+            self.assertEqual(view(request), ['replica_1'] * 3)
+        self.assertEqual(choose.call_count, 1)
+        # Outside the view everything reads from the primary again
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    @override_settings(REPLICA_DATABASES=['replica_1'], REPLICA_CACHE_ALIAS='default',
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_cache_is_refused(self):
+        [error] = routers.check_replica_cache(None)
+        self.assertEqual(error.id, 'api.E001')
+
+    @override_settings(REPLICA_DATABASES=['replica_1'], REPLICA_CACHE_ALIAS='default',
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}})
+    def test_shared_cache(self):
+        self.assertEqual(routers.check_replica_cache(None), [])
+
+
+
+class AsyncReplicaRoutingTests(TestCase):
+    """
+    The ASGI side of the routing against the database cache, which refuses to be
+    used from the event loop, so nothing here may touch it synchronously.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='reader@example.com', full_name='Reader')
+
+    def setUp(self):
+        overrides = override_settings(
+            REPLICA_DATABASES=['replica_1'], REPLICA_CACHE_ALIAS='sticky',
+            CACHES={**settings.CACHES, 'sticky': {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'replica_sticky',
+            }},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command('createcachetable', 'replica_sticky', stdout=StringIO())
+        self.router = routers.PrimaryReplicaRouter()
+
+    def request(self, method='get'):
+        request = getattr(RequestFactory(), method)('/')
+        request.user = self.user
+        return request
+
+    def test_write_pins_user(self):
+        async def view(request):
+            # What saving a model does
+            self.router.db_for_write(Letter)
+            return HttpResponse()
+
+        middleware = routers.ReplicaRoutingMiddleware(view)
+        self.assertTrue(middleware.async_mode)
+        async_to_sync(middleware)(self.request('post'))
+        self.assertTrue(routers.is_pinned(self.user.pk))
+
+    def test_replica_chosen_off_the_event_loop(self):
+        def choose_replica():
+            # The lag check queries the replica, which would block the loop
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            return 'replica_1'
+
+        @routers.read_from_replica
+        async def view(request):
+            return self.router.db_for_read(Letter)
+
+        with mock.patch('api.routers.choose_replica', side_effect=choose_replica) as choose:
+            self.assertEqual(async_to_sync(view)(self.request()), 'replica_1')
+            async_to_sync(routers.apin_to_primary)(self.user.pk)
+            self.assertEqual(async_to_sync(view)(self.request()), 'default')
+        self.assertEqual(choose.call_count, 1)
+
+@skipUnless(settings.REPLICA_DATABASES, "Set DATABASE_REPLICA_URLS to test replica routing")
+# The buffered activity would otherwise be flushed at exit, after the test database is gone
+@override_settings(HEARTBEAT_ENABLED=False)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Run with e.g. DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3 and a shared cache (see README):
+    in tests the replica alias reads the primary's test database (TEST MIRROR), so only the routing is checked.
+    """
+    databases = {'default', *settings.REPLICA_DATABASES}
+
+    def setUp(self):
+        for alias in caches:
+            caches[alias].clear()
+        routers._lag.clear()
+        self.user = User.objects.create(email='reader@example.com', full_name='Reader', last_login=timezone.now())
+        authentication.forget(self.user.pk)
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {CustomLoginSerializer.get_token(self.user).access_token}")
+        self.replica = settings.REPLICA_DATABASES[0]
+
+    def get(self, path, client=None):
+        """
+        (response, queries on the primary, queries on the replicas)
+        """
+        with CaptureQueriesContext(connections['default']) as primary, ExitStack() as stack:
+            replicas = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in settings.REPLICA_DATABASES]
+            response = (client or self.api).get(path)
+        return response, len(primary), sum(len(replica) for replica in replicas)
+
+    def test_reads_go_to_a_replica(self):
+        for path in ('/api/dashboard/', '/api/vault/', '/api/letters/', '/api/executor/',
+                     '/api/async/dashboard/', '/api/async/vault/', '/api/async/letters/', '/api/async/executor/'):
+            # Or the async dashboard is served from the summary the sync one cached
+            caches[settings.DASHBOARD_CACHE_ALIAS].clear()
+            response, primary, replica = self.get(path)
+            self.assertIn(response.status_code, (200, 404), path)
+            self.assertEqual(primary, 0, path)
+            self.assertGreater(replica, 0, path)
+
+    def test_reads_follow_own_writes(self):
+        response = self.api.post('/api/letters/', {"recipient": "Someone", "ciphertext": "Y2lwaGVy", "iv": "iv", "salt": "salt"}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response, primary, replica = self.get('/api/letters/')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch('api.routers.replica_lag', return_value=settings.REPLICA_MAX_LAG_SECONDS + 1):
+            response, primary, replica = self.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_admin_changelist_reads_from_replica(self):
+        staff = User.objects.create(email='staff@example.com', full_name='Staff', is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        response, primary, replica = self.get('/admin/api/letter/', self.client)
+        self.assertEqual(response.status_code, 200)
+        # The session and the staff user are loaded before the view runs
+        self.assertEqual(primary, 2)
+        self.assertGreater(replica, 0)
+
+
+class DocumentServingTests(TestCase):
+    """
+    The admin's verification document download: permissions, Range requests and proxy offloading.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(email='deceased@example.com', full_name='Deceased')
+        cls.executor = Executor.objects.create(
+            user=user, name='Executor', email='executor@example.com', phone='000', relationship='Sibling',
+            status=Executor.Status.VERIFICATION_PENDING,
+        )
+        cls.staff = User.objects.create(email='staff@example.com', full_name='Staff', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media, DOCUMENT_SENDFILE='', **TEST_SETTINGS)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.executor.verification_document.save('proof.pdf', ContentFile(PDF))
+        self.url = f"/admin/api/executor/{self.executor.pk}/document/"
+        self.client.force_login(self.staff)
+
+    def test_byte_range(self):
+        self.assertEqual(documents.byte_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(documents.byte_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(documents.byte_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(documents.byte_range('bytes=50-500', 100), (50, 99))
+        # Several ranges, or nonsense, get the whole file
+        self.assertIsNone(documents.byte_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(documents.byte_range('items=0-1', 100))
+        self.assertIsNone(documents.byte_range(None, 100))
+        with self.assertRaises(documents.RangeNotSatisfiable):
+            documents.byte_range('bytes=100-', 100)
+
+    def test_needs_staff(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+        # Staff without the view permission
+        clerk = User.objects.create(email='clerk@example.com', full_name='Clerk', is_staff=True)
+        self.client.force_login(clerk)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_media_is_not_public(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(f"/media/{self.executor.verification_document.name}").status_code, 404)
+
+    def test_changelist_links_to_the_view(self):
+        response = self.client.get('/admin/api/executor/')
+        self.assertContains(response, self.url)
+        self.assertNotContains(response, '/media/')
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), PDF[5:10])
+        self.assertEqual(response['Content-Range'], f"bytes 5-9/{len(PDF)}")
+        self.assertEqual(response['Content-Length'], '5')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), PDF[-4:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(PDF)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f"bytes */{len(PDF)}")
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+        # A partial copy of some other version gets the whole current file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), PDF)
+
+    def test_inline_pdf(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    def test_other_types_are_downloaded(self):
+        self.executor.verification_document.save('proof.html', ContentFile(b'<script>alert(1)</script>'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+        with override_settings(DOCUMENT_SENDFILE='x-accel-redirect', DOCUMENT_ACCEL_PREFIX='/protected-media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+    def test_x_accel_redirect(self):
+        with override_settings(DOCUMENT_SENDFILE='x-accel-redirect', DOCUMENT_ACCEL_PREFIX='/protected-media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f"/protected-media/{self.executor.verification_document.name}")
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_x_sendfile(self):
+        with override_settings(DOCUMENT_SENDFILE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.executor.verification_document.path)
+        self.assertEqual(response.content, b'')
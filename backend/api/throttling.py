@@ -0,0 +1,179 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'min': 60, 'hour': 3600, 'day': 86400}
+
+# Per-process stand-in for the shared cache when it is unreachable
+_local_windows = OrderedDict()
+_local_counters = {}
+_local_lock = threading.Lock()
+LOCAL_MAX_WINDOWS = 10000
+
+
+def parse_rate(rate):
+    """
+    '10/min' -> (capacity 10 requests, in any sliding window of 60 seconds).
+    """
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def _cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def _verdict(count, previous, capacity, period, elapsed):
+    """
+    (allowed, seconds to wait) for the `count`th request of this window, with `previous`
+    requests in the last one, weighted by how much of it still falls within `period`.
+    """
+    if count + previous * (period - elapsed) / period <= capacity:
+        return True, 0
+    if capacity < 1:
+        # A '0/period' rate turns the endpoint off
+        return False, period
+    if count <= capacity:
+        # Wait for the previous window to fade enough
+        return False, max(0, period - elapsed - period * (capacity - count) / previous)
+    # Full already: not before the next window, once this one's count has faded in turn
+    return False, period - elapsed + period * (1 - (capacity - 1) / max(count - 1, 1))
+
+
+def _take_slot(key, capacity, period, now):
+    """
+    Sliding window in the shared cache, see _verdict. Counts only move through
+    add/incr/decr, which are atomic on Redis and Memcached, so concurrent workers
+    can't let more than `capacity` requests through between them.
+    Returns (allowed, seconds until a request would be allowed).
+    """
+    window = int(now // period)
+    elapsed = now - window * period
+    current = f"{key}:{window}"
+    try:
+        # Kept for two periods, the next window still weighs this one
+        _cache().add(current, 0, 2 * period)
+        count = _cache().incr(current)
+        previous = _cache().get(f"{key}:{window - 1}", 0)
+    except Exception:
+        return _take_local_slot(key, capacity, period, now)
+
+    allowed, wait = _verdict(count, previous, capacity, period, elapsed)
+    if not allowed:
+        # Rejected requests don't use anything up
+        try:
+            _cache().decr(current)
+        except Exception:
+            pass
+    return allowed, wait
+
+
+def _take_local_slot(key, capacity, period, now):
+    window = int(now // period)
+    current = f"{key}:{window}"
+    with _local_lock:
+        count = _local_windows.pop(current, 0) + 1
+        previous = _local_windows.get(f"{key}:{window - 1}", 0)
+        allowed, wait = _verdict(count, previous, capacity, period, now - window * period)
+        _local_windows[current] = count if allowed else count - 1
+        while len(_local_windows) > LOCAL_MAX_WINDOWS:
+            _local_windows.popitem(last=False)
+    return allowed, wait
+
+
+def _counter_key(scope, kind):
+    return f"throttle:rejected:{scope}:{kind}"
+
+
+def _count_rejection(scope, kind):
+    key = _counter_key(scope, kind)
+    with _local_lock:
+        _local_counters[key] = _local_counters.get(key, 0) + 1
+    try:
+        _cache().add(key, 0, None)
+        _cache().incr(key)
+    except Exception:
+        pass
+
+
+def rejection_counts():
+    """
+    Rejections per scope and key type, shared across workers when the cache is,
+    plus this process' own counts.
+    """
+    keys = [_counter_key(scope, kind) for scope in settings.API_THROTTLE_RATES for kind in ('ip', 'email')]
+    try:
+        shared = _cache().get_many(keys)
+    except Exception:
+        shared = {}
+
+    stats = {}
+    for scope in settings.API_THROTTLE_RATES:
+        stats[scope] = {
+            kind: {
+                "total": shared.get(_counter_key(scope, kind), 0),
+                "this_process": _local_counters.get(_counter_key(scope, kind), 0),
+            }
+            for kind in ('ip', 'email')
+        }
+    return stats
+
+
+def consume(scope, ident, get_email=None):
+    """
+    Counts the request against the scope's IP window, then its email window.
+    `get_email` is only called once the IP passed, so rejected bodies are never parsed.
+    Returns (allowed, seconds to wait).
+    """
+    rate = settings.API_THROTTLE_RATES.get(scope)
+    if not rate:
+        return True, None
+
+    capacity, period = parse_rate(rate)
+    now = time.time()
+
+    allowed, wait = _take_slot(f"throttle:{scope}:ip:{ident}", capacity, period, now)
+    if not allowed:
+        _count_rejection(scope, 'ip')
+        return False, wait
+
+    email = get_email() if get_email else None
+    if email:
+        digest = hashlib.sha256(email.encode()).hexdigest()
+        allowed, wait = _take_slot(f"throttle:{scope}:email:{digest}", capacity, period, now)
+        if not allowed:
+            _count_rejection(scope, 'email')
+            return False, wait
+
+    return True, None
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Limits a view (by its `throttle_scope`) per client IP and per submitted email.
+    The IP is checked first, so an already-rejected client never gets its body parsed.
+    Views set `throttle_email_field` to the request field holding the email, or None for IP only.
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        allowed, self.wait_seconds = consume(scope, self.get_ident(request), lambda: self._submitted_email(request, view))
+        return allowed
+
+    def _submitted_email(self, request, view):
+        field = getattr(view, 'throttle_email_field', 'email')
+        if field is None:
+            return None
+        try:
+            email = request.data.get(field)
+        except Exception:
+            return None
+        return email.strip().lower() if isinstance(email, str) else None
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
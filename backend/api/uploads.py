@@ -0,0 +1,220 @@
+"""
+Chunked, resumable uploads for executor verification documents.
+
+A client creates an upload with the file's name, type and total size, then sends
+the bytes in one or more PATCH requests, each starting at the server's current
+offset. A dropped connection only loses the chunk in flight: the client asks for
+the offset and carries on from there.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.http import UnreadablePostError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import DocumentUpload, Executor
+from .parsers import CHUNK_SIZE, PayloadTooLarge
+
+# First bytes of each accepted document type
+SIGNATURES = {
+    'application/pdf': (b'%PDF-',),
+    'image/jpeg': (b'\xff\xd8\xff',),
+    'image/png': (b'\x89PNG\r\n\x1a\n',),
+}
+SNIFF_BYTES = max(len(sig) for sigs in SIGNATURES.values() for sig in sigs)
+
+# Running sha256 per upload, so resumed chunks don't re-read the partial file.
+# A chunk landing on another worker rebuilds the hash from the file once.
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+MAX_HASHERS = 256
+
+
+class OffsetConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Upload-Offset does not match the uploaded size.'
+    default_code = 'offset_conflict'
+
+
+class UnsupportedDocument(APIException):
+    status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    default_detail = 'Documents must be PDF, JPEG or PNG files.'
+    default_code = 'unsupported_document'
+
+
+def partial_path(upload):
+    return os.path.join(settings.DOCUMENT_UPLOAD_TEMP_DIR, f"{upload.pk}.part")
+
+
+class PartialFile(File):
+    """
+    Lets FileSystemStorage move the finished partial file into place
+    instead of copying it a second time.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def start(executor, filename, content_type, size):
+    """
+    Validates the declared file before any bytes are sent and creates the upload.
+    Replaces any unfinished upload the executor had left behind.
+    """
+    if content_type not in SIGNATURES:
+        raise UnsupportedDocument()
+    if size <= 0:
+        raise ValidationError({"size": "Must be greater than zero."})
+    if size > settings.DOCUMENT_UPLOAD_MAX_BYTES:
+        raise PayloadTooLarge()
+
+    for stale in executor.document_uploads.filter(completed_at__isnull=True):
+        discard(stale)
+
+    upload = DocumentUpload.objects.create(
+        executor=executor,
+        filename=os.path.basename(filename)[:255] or 'document',
+        content_type=content_type,
+        size=size,
+    )
+    os.makedirs(settings.DOCUMENT_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(partial_path(upload), 'wb').close()
+    return upload
+
+
+def discard(upload):
+    with _hashers_lock:
+        _hashers.pop(upload.pk, None)
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def _check_signature(upload, head):
+    if not any(head.startswith(sig) for sig in SIGNATURES[upload.content_type]):
+        raise UnsupportedDocument("File contents don't match its declared type.")
+
+
+def _hasher_at(upload, offset):
+    with _hashers_lock:
+        cached = _hashers.pop(upload.pk, None)
+    if cached and cached[0] == offset:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = offset
+    with open(partial_path(upload), 'rb') as partial:
+        while remaining:
+            block = partial.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def _keep_hasher(upload, offset, hasher):
+    with _hashers_lock:
+        _hashers[upload.pk] = (offset, hasher)
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def append(upload, offset, stream):
+    """
+    Streams one chunk from `stream` onto the partial file at `offset`, hashing as it goes.
+    Never reads past the declared size. Returns the new offset; if the connection
+    drops mid-chunk, the bytes that made it are kept so the client can resume after them.
+    """
+    if upload.is_complete:
+        raise OffsetConflict('Upload is already complete.')
+    if offset != upload.offset:
+        raise OffsetConflict()
+
+    hasher = _hasher_at(upload, offset)
+    position = offset
+    # The signature is checked from the first chunk, so it has to contain it
+    head = b'' if offset == 0 else None
+
+    interrupted = None
+
+    with open(partial_path(upload), 'r+b') as partial:
+        partial.seek(offset)
+        while True:
+            try:
+                block = stream.read(CHUNK_SIZE)
+            except (UnreadablePostError, OSError) as e:
+                # Client went away mid-chunk, keep what already arrived
+                interrupted = e
+                break
+            if not block:
+                break
+            if position + len(block) > upload.size:
+                raise PayloadTooLarge('Chunk runs past the declared upload size.')
+
+            # Check the file signature before anything is written
+            if head is not None:
+                head += block[:SNIFF_BYTES - len(head)]
+                if len(head) >= SNIFF_BYTES or position + len(block) == upload.size:
+                    _check_signature(upload, head)
+                    head = None
+
+            partial.write(block)
+            hasher.update(block)
+            position += len(block)
+
+    if head and interrupted:
+        # The signature was never checked, so none of it counts
+        raise interrupted
+    if head:
+        _check_signature(upload, head)
+    if position == offset:
+        if interrupted:
+            raise interrupted
+        return offset
+
+    # Another request may have appended the same chunk meanwhile, only one of them moves the offset
+    if not DocumentUpload.objects.filter(pk=upload.pk, offset=offset).update(offset=position):
+        raise OffsetConflict()
+    upload.offset = position
+
+    if interrupted:
+        _keep_hasher(upload, position, hasher)
+        raise interrupted
+
+    if position == upload.size:
+        finish(upload, hasher.hexdigest())
+    else:
+        _keep_hasher(upload, position, hasher)
+    return position
+
+
+def finish(upload, digest):
+    """
+    Attaches the completed file to the executor for the admin to review.
+    """
+    with transaction.atomic():
+        executor = Executor.objects.select_for_update().get(pk=upload.executor_id)
+        with open(partial_path(upload), 'rb') as partial:
+            executor.verification_document.save(upload.filename, PartialFile(partial), save=False)
+        executor.is_verified = False  # Admin must manually verify this in Admin Panel
+        executor.save(update_fields=['verification_document', 'is_verified', 'updated_at'])
+
+        upload.sha256 = digest
+        upload.completed_at = timezone.now()
+        upload.save(update_fields=['sha256', 'completed_at'])
+
+    # Storage backends that can't move files copy it instead, tidy up either way
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
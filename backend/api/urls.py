@@ -1,6 +1,6 @@
 from django.urls import path
-from . import views
-from .views import ExecutorVerificationView, LetterView, LoginView, LegacyDataView, RegisterUserView, VaultView ,ExecutorView
+from . import async_views, metrics, views
+from .views import CheckInView, HeartbeatView, DocumentUploadView, DocumentUploadDetailView, ExecutorVerificationView, LetterView, LetterBatchView, LetterDetailView, LoginView, LegacyDataView, RegisterUserView, VaultView ,ExecutorView, VaultItemsView, VaultItemDetailView, VaultUploadView, OpsStatsView
 
 
 urlpatterns = [
@@ -8,9 +8,27 @@ urlpatterns = [
     path('register/', RegisterUserView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('dashboard/', views.dashboard_stats, name='dashboard_stats'),
+    path('check-in/', CheckInView.as_view(), name='check_in'),
+    path('check-in/heartbeat/', HeartbeatView.as_view(), name='heartbeat'),
     path('vault/', VaultView.as_view(), name='vault'),
+    path('vault/upload/', VaultUploadView.as_view(), name='vault_upload'),
+    path('vault/items/', VaultItemsView.as_view(), name='vault_items'),
+    path('vault/items/<str:item_id>/', VaultItemDetailView.as_view(), name='vault_item_detail'),
     path('letters/', LetterView.as_view(), name='letters'),
+    path('letters/bulk/', LetterBatchView.as_view(), name='letters_bulk'),
+    path('letters/<int:pk>/', LetterDetailView.as_view(), name='letter_detail'),
     path('executor/', ExecutorView.as_view(), name='executor'),
     path('verify-executor/', ExecutorVerificationView.as_view(), name='verify_executor'),
+    path('verify-executor/uploads/', DocumentUploadView.as_view(), name='document_upload'),
+    path('verify-executor/uploads/<uuid:upload_id>/', DocumentUploadDetailView.as_view(), name='document_upload_detail'),
     path('legacy-data/', LegacyDataView.as_view(), name='legacy_data'),
+    path('async/login/', async_views.login, name='async_login'),
+    path('async/register/', async_views.register, name='async_register'),
+    path('async/dashboard/', async_views.dashboard, name='async_dashboard'),
+    path('async/vault/', async_views.vault, name='async_vault'),
+    path('async/letters/', async_views.letter_list, name='async_letters'),
+    path('async/letters/<int:pk>/', async_views.letter_detail, name='async_letter_detail'),
+    path('async/executor/', async_views.executor, name='async_executor'),
+    path('ops/stats/', OpsStatsView.as_view(), name='ops_stats'),
+    path('ops/metrics/', metrics.metrics_view, name='ops_metrics'),
 ]
\ No newline at end of file
@@ -1,27 +1,57 @@
-from .serializers import LetterSerializer, UserRegistrationSerializer
+from .serializers import CheckInSerializer, LetterBatchSerializer, LetterSerializer, LetterSummarySerializer, UserRegistrationSerializer
+from .pagination import LetterCursorPagination
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
+from .permissions import IsStaff
+from .throttling import SlidingWindowThrottle, rejection_counts
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Vault
-from .serializers import VaultSerializer
+from .serializers import VaultSerializer, VaultSyncSerializer, VaultUploadSerializer
 from rest_framework.views import APIView
-from .models import Vault, Letter, Executor
+from .models import DocumentUpload, Vault, VaultItem, Letter, Executor, encode_ciphertext_row
+from . import authentication, hashing, heartbeat, letters, summary, sync, uploads
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+from .parsers import Base64CiphertextParser, CiphertextParser, PayloadTooLarge
+from django.db.models import Count, Max
+from .routers import read_from_replica
+from .conditional import expected_version, is_not_modified, make_etag, not_modified, with_etag
+import json
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from rest_framework.utils.encoders import JSONEncoder
 
 
 User = get_user_model()
 
+# Rows fetched per round-trip when streaming legacy data
+LEGACY_STREAM_CHUNK_SIZE = 100
+
 class CustomLoginSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Lets ClaimsJWTAuthentication build request.user without a query
+        return authentication.add_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
+        # A successful login is a check-in for the dead-man switch
+        User.objects.record_check_in(self.user.pk)
+        summary.invalidate(self.user.pk)
         data['user'] = {
             'id': self.user.id,
             'email': self.user.email,
@@ -29,11 +59,26 @@ class CustomLoginSerializer(TokenObtainPairSerializer):
         }
         return data
 
+class HeartbeatTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # The SPA refreshing its token means the user is around
+        user_id = self.token_class(attrs['refresh']).payload.get(jwt_settings.USER_ID_CLAIM)
+        if user_id:
+            heartbeat.record(user_id)
+        return data
+
+class RefreshView(TokenRefreshView):
+    serializer_class = HeartbeatTokenRefreshSerializer
+
 class RegisterUserView(generics.CreateAPIView):
     queryset = User.objects.all()
     # AllowAny is required so unauthenticated users can actually reach the signup page
     permission_classes = [AllowAny]
     serializer_class = UserRegistrationSerializer
+    # Rate limited before the password gets hashed
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'register'
 
 class LoginView(TokenObtainPairView):
     """
@@ -41,24 +86,20 @@ class LoginView(TokenObtainPairView):
     and returns an access token, refresh token, and user data.
     """
     serializer_class = CustomLoginSerializer
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'login'
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_from_replica
 def dashboard_stats(request):
-    user = request.user
-    
-    # 1. Get real Vault count
-    try:
-        vault = Vault.objects.get(user=user)
-        vault_count = vault.item_count
-    except Vault.DoesNotExist:
-        vault_count = 0
-        
-    # 2. Get real Letter count
-    letter_count = Letter.objects.filter(user=user).count()
-    
-    # 3. Check if they have at least one active or pending Executor
-    has_exec = Executor.objects.filter(user=user).exists()
+    # Vault count, letter count and executor check come from one cached query
+    return Response(dashboard_payload(summary.get_summary(request.user.pk)))
+
+def dashboard_payload(stats):
+    vault_count = stats['vault_count']
+    letter_count = stats['letter_count']
+    has_exec = stats['has_executor']
     
     # Calculate Completion Score dynamically based on their progress!
     completion_score = 10 # Base score for signing up
@@ -67,51 +108,206 @@ def dashboard_stats(request):
     if has_exec: completion_score += 30
     
     # Format the user's name gracefully
-    full_name = user.full_name if hasattr(user, 'full_name') and user.full_name else user.username
-    last_seen_date = user.last_login or user.date_joined
+    full_name = stats['full_name'] or stats['email']
+    last_seen_date = stats['last_login'] or stats['date_joined']
     last_check_in = last_seen_date.strftime("%b %d, %Y") if last_seen_date else "Just now"
 
-    return Response({
+    return {
         "fullname": full_name,
         "completionPercentage": completion_score,
         "vaultItemsCount": vault_count,
         "lettersCount": letter_count,
         "hasExecutor": "Yes" if has_exec else "No",
         "lastCheckIn": last_check_in
-    })
+    }
+
+class CheckInView(APIView):
+    """
+    GET shows the user's check-in schedule, POST checks in, PATCH changes the interval.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = User.objects.only('last_login', 'check_in_interval', 'next_due_at').get(pk=request.user.pk)
+        return Response(CheckInSerializer(user).data)
+
+    def post(self, request):
+        User.objects.record_check_in(request.user.pk)
+        summary.invalidate(request.user.pk)
+        return self.get(request)
+
+    def patch(self, request):
+        user = User.objects.only('last_login', 'check_in_interval', 'next_due_at').get(pk=request.user.pk)
+        serializer = CheckInSerializer(user, data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user.check_in_interval = timedelta(days=serializer.validated_data['check_in_interval']['days'])
+        user.next_due_at = (user.last_login or timezone.now()) + user.check_in_interval
+        user.save(update_fields=['check_in_interval', 'next_due_at'])
+        return Response(CheckInSerializer(user).data)
+
+class HeartbeatView(APIView):
+    """
+    Cheap "I'm still here" for the dead-man switch, e.g. sent by the SPA while it is open.
+    Buffered and written in bulk (see heartbeat.py); POST /check-in/ writes straight away.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        heartbeat.record(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+def save_vault_response(request, values, data):
+    """
+    Saves the vault against the version the client last saw (If-Match, If-None-Match: *
+    or an `expected_version` field) and returns 409 if another save landed in between.
+    Clients that send no precondition are checked against the version as of this request.
+    """
+    user = request.user
+    expected = expected_version(request, user.pk)
+    if expected is None and 'expected_version' in request.query_params:
+        expected = request.query_params['expected_version']
+    if expected is None and isinstance(request.data, dict):
+        expected = request.data.get('expected_version')
+    if expected is None:
+        expected = Vault.objects.filter(user=user).values_list('version', flat=True).first() or 0
+    try:
+        expected = int(expected)
+    except (TypeError, ValueError):
+        return Response({"expected_version": "Must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    version = sync.save_vault(user, values, expected)
+    if version is None:
+        current = Vault.objects.filter(user=user).values_list('version', flat=True).first() or 0
+        response = Response({
+            "error": "The vault was changed elsewhere. Reload it and try again.",
+            "version": current,
+        }, status=status.HTTP_409_CONFLICT)
+        return with_etag(response, make_etag(user.pk, current))
+
+    # .update() skips post_save, so the dashboard cache has to be told directly
+    summary.invalidate(user.pk)
+    return with_etag(Response(dict(data, version=version), status=status.HTTP_200_OK), make_etag(user.pk, version))
 
 class VaultView(APIView):
     permission_classes = [IsAuthenticated] # Bouncer is active
 
+    @read_from_replica
     def get(self, request):
-        try:
-            vault = Vault.objects.get(user=request.user)
-            serializer = VaultSerializer(vault)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Vault.DoesNotExist:
+        # Check the version first so an unchanged vault never loads the ciphertext
+        version = Vault.objects.filter(user=request.user).values_list('version', flat=True).first()
+        if version is None:
             # If the user is new and hasn't saved anything yet, return a clean empty state
             return Response({"message": "Vault not initialized"}, status=status.HTTP_200_OK)
 
+        etag = make_etag(request.user.pk, version)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+        vault = Vault.objects.get(user=request.user)
+        serializer = VaultSerializer(vault)
+        return with_etag(Response(serializer.data, status=status.HTTP_200_OK), make_etag(request.user.pk, vault.version))
+
     def post(self, request):
-        # Fetch the existing vault, or create a blank one if it's their first time
-        vault, created = Vault.objects.get_or_create(user=request.user)
-        
-        # Pass the instance to the serializer so it UPDATES instead of duplicating
-        serializer = VaultSerializer(vault, data=request.data)
-        
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-            
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = VaultSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Build the column values on an unsaved instance so the storage mode is applied
+        values = dict(serializer.validated_data)
+        draft = Vault()
+        draft.encoded_ciphertext = values.pop('encoded_ciphertext')
+        values.update(ciphertext=draft.ciphertext, ciphertext_raw=draft.ciphertext_raw)
+
+        # Echo what was stored, encoded the way GET returns it (serializer.data would show raw bytes)
+        return save_vault_response(request, values, VaultSerializer(Vault(**values)).data)
+
+class VaultUploadView(APIView):
+    """
+    Streaming alternative to VaultView.post for large vaults.
+    The body is the ciphertext itself (raw bytes, or base64 as text/plain) and
+    iv, salt, item_count (and optionally expected_version) travel as query params,
+    so the upload is never held as JSON plus serializer copies.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = (CiphertextParser, Base64CiphertextParser)
+
+    def put(self, request):
+        meta = VaultUploadSerializer(data=request.query_params)
+        if not meta.is_valid():
+            return Response(meta.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Reject oversized uploads from the header alone, before reading any of the body
+        limit = settings.VAULT_UPLOAD_MAX_BYTES
+        if request.content_type.startswith(Base64CiphertextParser.media_type):
+            limit = (limit + 2) // 3 * 4
+        try:
+            declared = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            declared = 0
+        if declared > limit:
+            raise PayloadTooLarge()
+
+        ciphertext = request.data
+        if not isinstance(ciphertext, bytearray):
+            return Response({"error": "Send the ciphertext as application/octet-stream or text/plain."}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        draft = Vault()
+        draft.set_raw_ciphertext(ciphertext)
+        values = dict(meta.validated_data, ciphertext=draft.ciphertext, ciphertext_raw=draft.ciphertext_raw)
+
+        return save_vault_response(request, values, {"item_count": values.get('item_count'), "size": len(ciphertext)})
+
+class VaultItemsView(APIView):
+    """
+    Delta sync for per-item vault storage.
+    GET ?since=<version> returns only what changed, POST uploads only what changed.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            return Response({"error": "since must be a vault version number."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sync.changes_since(request.user, since), status=status.HTTP_200_OK)
+
+    def post(self, request):
+        serializer = VaultSyncSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        version = sync.apply_changes(request.user, **serializer.validated_data)
+        return Response({"version": version}, status=status.HTTP_200_OK)
+
+class VaultItemDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, item_id):
+        if not VaultItem.objects.filter(user=request.user, item_id=item_id, is_deleted=False).exists():
+            return Response({"error": "Vault item not found."}, status=status.HTTP_404_NOT_FOUND)
+        version = sync.apply_changes(request.user, deletes=[item_id])
+        return Response({"version": version}, status=status.HTTP_200_OK)
     
 class LetterView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @read_from_replica
     def get(self, request):
         letters = Letter.objects.filter(user=request.user)
-        serializer = LetterSerializer(letters, many=True)
-        return Response(serializer.data)
+
+        # Any create, edit or delete changes either the count or the newest timestamp
+        summary = letters.aggregate(count=Count('id'), latest=Max('updated_at'))
+        etag = make_etag(request.user.pk, summary['count'], summary['latest'] or 0)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+        # Metadata only, the heavy ciphertext columns are never read for the list
+        paginator = LetterCursorPagination()
+        page = paginator.paginate_queryset(letters.only('id', 'title', 'recipient', 'created_at'), request, view=self)
+        serializer = LetterSummarySerializer(page, many=True)
+        return with_etag(paginator.get_paginated_response(serializer.data), etag)
 
     def post(self, request):
         serializer = LetterSerializer(data=request.data)
@@ -120,19 +316,59 @@ class LetterView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+class LetterBatchView(APIView):
+    """
+    Creates, updates and deletes many letters in one request and one transaction,
+    e.g. re-encrypting every letter after a master-password change.
+    Body: {"create": [...], "update": [{"id": ..., ...}], "delete": [ids]}.
+    Nothing is written unless every item is valid; the response has a result per item.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = LetterBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        applied, results = letters.apply_batch(request.user, **serializer.validated_data)
+        if not applied:
+            return Response(results, status=status.HTTP_404_NOT_FOUND)
+        return Response(results, status=status.HTTP_200_OK)
+
+class LetterDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @read_from_replica
+    def get(self, request, pk):
+        updated_at = Letter.objects.filter(user=request.user, pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return Response({"error": "Letter not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = make_etag(request.user.pk, pk, updated_at)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+
+        letter = Letter.objects.get(user=request.user, pk=pk)
+        return with_etag(Response(LetterSerializer(letter).data), make_etag(request.user.pk, pk, letter.updated_at))
+
 class ExecutorView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @read_from_replica
     def get(self, request):
         try:
             # Look for the executor assigned to the logged-in user
-            executor = Executor.objects.get(user=request.user)
-            return Response({
+            executor = Executor.objects.only('name', 'email', 'status', 'relationship', 'updated_at').get(user=request.user)
+            etag = make_etag(request.user.pk, executor.updated_at)
+            if is_not_modified(request, etag):
+                return not_modified(etag)
+
+            return with_etag(Response({
                 "name": executor.name,
                 "email": executor.email,
-                "status": executor.status,
+                "status": executor.get_status_display(),
                 "relationship": executor.relationship
-            })
+            }), etag)
         except Executor.DoesNotExist:
             # Return 404 so the frontend knows to show the "Assign" form
             return Response({"message": "No executor assigned"}, status=status.HTTP_404_NOT_FOUND)
@@ -154,11 +390,13 @@ class ExecutorVerificationView(APIView):
     # This must be AllowAny because the Executor doesn't have a user account yet
     permission_classes = [AllowAny] 
     parser_classes = (MultiPartParser, FormParser)
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'verify_executor'
 
     def post(self, request):
         email = request.data.get('email')
         try:
-            executor = Executor.objects.get(email=email, status='Verification_Pending')
+            executor = Executor.objects.get(email=email, status=Executor.Status.VERIFICATION_PENDING)
             
             if 'document' in request.FILES:
                 executor.verification_document = request.FILES['document']
@@ -170,9 +408,140 @@ class ExecutorVerificationView(APIView):
         except Executor.DoesNotExist:
             return Response({"error": "Invalid request or unauthorized email."}, status=status.HTTP_404_NOT_FOUND)
 
+class DocumentUploadView(APIView):
+    """
+    Starts a resumable upload of a verification document.
+    Takes the executor's email plus the file's name, content_type and size, and
+    returns the upload id to send the bytes to (see DocumentUploadDetailView).
+    """
+    permission_classes = [AllowAny]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'verify_executor'
+
+    def post(self, request):
+        try:
+            executor = Executor.objects.get(email=request.data.get('email'), status=Executor.Status.VERIFICATION_PENDING)
+        except Executor.DoesNotExist:
+            return Response({"error": "Invalid request or unauthorized email."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response({"size": "A whole number of bytes is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = uploads.start(executor, str(request.data.get('filename') or ''), request.data.get('content_type'), size)
+        response = Response({"upload_id": upload.pk, "offset": 0, "size": upload.size}, status=status.HTTP_201_CREATED)
+        response['Location'] = reverse('document_upload_detail', args=[upload.pk])
+        response['Upload-Offset'] = '0'
+        return response
+
+class DocumentUploadDetailView(APIView):
+    """
+    GET (or HEAD) reports how many bytes have arrived, PATCH appends the next chunk.
+    PATCH sends raw bytes with an Upload-Offset header equal to the current offset;
+    after a dropped connection the client GETs the offset and sends the rest from there.
+    """
+    permission_classes = [AllowAny]
+    # The body is read straight off the socket in uploads.append, never parsed
+    parser_classes = ()
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'document_upload'
+    throttle_email_field = None
+
+    def get_upload(self, upload_id):
+        return DocumentUpload.objects.filter(
+            pk=upload_id, executor__status=Executor.Status.VERIFICATION_PENDING
+        ).first()
+
+    def progress(self, upload, status_code=status.HTTP_200_OK):
+        body = None if status_code == status.HTTP_204_NO_CONTENT else {
+            "offset": upload.offset,
+            "size": upload.size,
+            "complete": upload.is_complete,
+            "sha256": upload.sha256 or None,
+        }
+        response = Response(body, status=status_code)
+        response['Upload-Offset'] = str(upload.offset)
+        response['Upload-Length'] = str(upload.size)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def get(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        if upload is None:
+            return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+        return self.progress(upload)
+
+    def patch(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        if upload is None:
+            return Response({"error": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+        except (KeyError, ValueError):
+            return Response({"error": "Upload-Offset header is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Reject a chunk that can't fit from the header alone, before reading any of it
+        try:
+            declared = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            declared = 0
+        if declared > upload.size - upload.offset:
+            raise PayloadTooLarge('Chunk runs past the declared upload size.')
+        # DRF has no stream at all for an empty body
+        if request.stream is None:
+            return Response({"error": "Empty chunk."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            uploads.append(upload, offset, request.stream)
+        except uploads.OffsetConflict as e:
+            response = self.progress(upload, status.HTTP_409_CONFLICT)
+            response.data["error"] = e.detail
+            return response
+
+        return self.progress(upload, status.HTTP_200_OK if upload.is_complete else status.HTTP_204_NO_CONTENT)
+
+def _json_array(rows, transform=None):
+    # Encodes one row at a time so only the current row is ever in memory
+    first = True
+    for row in rows:
+        if transform:
+            row = transform(row)
+        yield ('' if first else ',') + json.dumps(row, cls=JSONEncoder)
+        first = False
+
+
+def _stream_legacy_data(sections):
+    yield '{"message": "Access granted. Data ready for local decryption."'
+    for name, rows, transform in sections:
+        yield f', "{name}": ['
+        # iterator() uses server-side cursors on Postgres instead of loading the whole table
+        yield from _json_array(rows.iterator(chunk_size=LEGACY_STREAM_CHUNK_SIZE), transform)
+        yield ']'
+    yield '}'
+
+
+async def _astream_legacy_data(sections):
+    # Under ASGI Django reads a sync iterator to the end before sending anything,
+    # so hand it over a batch of rows at a time from the sync thread instead
+    parts = _stream_legacy_data(sections)
+    next_batch = sync_to_async(lambda: ''.join(islice(parts, LEGACY_STREAM_CHUNK_SIZE)))
+    while batch := await next_batch():
+        yield batch
+
+
 class LegacyDataView(APIView):
+    """
+    Hands the encrypted estate to a verified executor.
+    Add ?stream=1 to get the same JSON written out record by record, which keeps
+    worker memory flat for large estates and slow connections.
+    """
     # AllowAny because the executor does not have a standard user login token
     permission_classes = [AllowAny]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'legacy_data'
+    throttle_email_field = 'executor_email'
 
     def post(self, request):
         executor_email = request.data.get('executor_email')
@@ -182,24 +551,50 @@ class LegacyDataView(APIView):
             return Response({"error": "Both executor and target emails are required."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            target_user = User.objects.get(email=target_email)
-            
             # Strict security check: Ensure status is Access_Granted and is_verified is True
-            executor = Executor.objects.get(
+            executor = Executor.objects.only('user_id').get(
                 email=executor_email, 
-                user=target_user,
-                status='Access_Granted',
+                user__email=target_email,
+                status=Executor.Status.ACCESS_GRANTED,
                 is_verified=True
             )
-        except (User.DoesNotExist, Executor.DoesNotExist):
+        except Executor.DoesNotExist:
             return Response({"error": "Access denied. Verification incomplete or records not found."}, status=status.HTTP_403_FORBIDDEN)
 
         # Fetch the encrypted items
-        vault_items = Vault.objects.filter(user=target_user).values('id', 'item_count', 'ciphertext', 'iv', 'salt')
-        letters = Letter.objects.filter(user=target_user).values('id', 'recipient', 'ciphertext', 'iv', 'salt')
+        vault_items = Vault.objects.filter(user_id=executor.user_id).values('id', 'item_count', 'ciphertext', 'ciphertext_raw', 'iv', 'salt')
+        vault_entries = VaultItem.objects.filter(user_id=executor.user_id, is_deleted=False).values('item_id', 'ciphertext', 'iv')
+        letters = Letter.objects.filter(user_id=executor.user_id).values('id', 'recipient', 'ciphertext', 'ciphertext_raw', 'iv', 'salt')
+
+        if request.query_params.get('stream') in ('1', 'true'):
+            sections = [
+                ("vault_items", vault_items, encode_ciphertext_row),
+                ("vault_entries", vault_entries, None),
+                ("letters", letters, encode_ciphertext_row),
+            ]
+            if isinstance(request._request, ASGIRequest):
+                return StreamingHttpResponse(_astream_legacy_data(sections), content_type='application/json')
+            return StreamingHttpResponse(_stream_legacy_data(sections), content_type='application/json')
 
         return Response({
             "message": "Access granted. Data ready for local decryption.",
-            "vault_items": list(vault_items),
-            "letters": list(letters)
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            "vault_items": [encode_ciphertext_row(row) for row in vault_items],
+            "vault_entries": list(vault_entries),
+            "letters": [encode_ciphertext_row(row) for row in letters]
+        }, status=status.HTTP_200_OK)
+
+
+class OpsStatsView(APIView):
+    """
+    Staff-only counters for tuning the production limits.
+    """
+    permission_classes = [IsStaff]
+
+    def get(self, request):
+        return Response({
+            "throttles": {
+                "rates": settings.API_THROTTLE_RATES,
+                "rejected": rejection_counts(),
+            },
+            "password_hashing": hashing.stats(),
+        })
@@ -1,5 +1,6 @@
 import os
 import dj_database_url
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -29,6 +30,13 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = f"Endura Legacy System <{EMAIL_HOST_USER}>"
 
+# Used for links in notification emails
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
+
+# How long deliver_outbox keeps a claimed batch to itself. Must outlast sending a
+# whole batch, after that the rows are up for grabs again (e.g. the worker died).
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', '300'))
+
 # --- APPLICATION DEFINITION ---
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -44,19 +52,40 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Off unless QUERY_INSTRUMENTATION is set, it then removes itself at startup
+    'api.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # CRITICAL: Must be right below SecurityMiddleware
+    'api.staticfiles.StaticFilesMiddleware',  # CRITICAL: Must be right below SecurityMiddleware (WhiteNoise, async-capable)
+    # Below WhiteNoise so static files aren't counted as API requests
+    'api.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Pins users to the primary after they write; removes itself without replicas
+    'api.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
 
+# --- METRICS ---
+# Prometheus text at /api/ops/metrics/. For multi-worker deployments also export
+# PROMETHEUS_MULTIPROC_DIR (an empty directory shared with the cron commands), see api/metrics.py.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+# Bearer token Prometheus scrapes with; unset means only staff sessions can read the metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# --- QUERY INSTRUMENTATION ---
+# Server-Timing headers plus JSON logs (logger 'api.instrumentation') for slow requests
+# and for SQL repeated often enough to look like an N+1. Works under WSGI and ASGI (uvicorn)
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', 'False') == 'True'
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+# Same statement this many times in one request counts as repeated
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -73,14 +102,79 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 # --- DATABASE ---
+# Connection pool per worker process (PostgreSQL with psycopg 3 only). Use it under ASGI: conn_max_age
+# keeps one connection per thread, and there each request's queries run on a thread of their own.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'False') == 'True'
+DATABASE_POOL_MIN_SIZE = int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2))
+DATABASE_POOL_MAX_SIZE = int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10))
+# Seconds a query waits for a free connection before failing
+DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', 10))
+
+
+def _pooled(database):
+    if DATABASE_POOL and database['ENGINE'] == 'django.db.backends.postgresql':
+        # The pool replaces persistent connections, Django refuses both at once
+        database['CONN_MAX_AGE'] = 0
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DATABASE_POOL_MIN_SIZE,
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            'timeout': DATABASE_POOL_TIMEOUT,
+        }
+    return database
+
+
 # Automatically uses PostgreSQL on Render, and SQLite on your local machine
 DATABASES = {
-    'default': dj_database_url.config(
+    'default': _pooled(dj_database_url.config(
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
         conn_max_age=600
-    )
+    ))
+}
+
+# Read replicas, comma-separated URLs. Views marked @read_from_replica and the admin changelists
+# read from them; writes and everything else stay on the primary (see api/routers.py)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+REPLICA_DATABASES = []
+for number, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = _pooled(dj_database_url.parse(url, conn_max_age=600))
+    # Tests read the test database through the replica alias instead of creating another one
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(alias)
+DATABASE_ROUTERS = ['api.routers.PrimaryReplicaRouter']
+# After a user writes, their reads stay on the primary this long (read-your-writes).
+# REPLICA_CACHE_ALIAS must be shared by every worker (not LocMem), the api.E001 check enforces it.
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 15))
+REPLICA_CACHE_ALIAS = os.environ.get('REPLICA_CACHE_ALIAS', 'default')
+# A replica further behind than this is skipped; lag is re-measured every REPLICA_LAG_CHECK_INTERVAL seconds
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5))
+
+# --- CACHING ---
+# Local memory by default, point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached to share it between workers
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'endura'),
+    }
+}
+DASHBOARD_CACHE_ALIAS = os.environ.get('DASHBOARD_CACHE_ALIAS', 'default')
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 300))
+
+# --- RATE LIMITING ---
+# Limits for the unauthenticated endpoints, applied per client IP and per submitted email.
+# 'N/period' allows N requests in any sliding period (s, min, hour, day).
+THROTTLE_CACHE_ALIAS = os.environ.get('THROTTLE_CACHE_ALIAS', 'default')
+API_THROTTLE_RATES = {
+    'register': os.environ.get('THROTTLE_REGISTER', '5/min'),
+    'login': os.environ.get('THROTTLE_LOGIN', '10/min'),
+    'verify_executor': os.environ.get('THROTTLE_VERIFY_EXECUTOR', '5/min'),
+    'legacy_data': os.environ.get('THROTTLE_LEGACY_DATA', '10/min'),
+    # One request per chunk, so this one is per IP only and much looser
+    'document_upload': os.environ.get('THROTTLE_DOCUMENT_UPLOAD', '120/min'),
 }
 
 # --- PASSWORD VALIDATION ---
@@ -91,14 +185,66 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',},
 ]
 
+# --- PASSWORD HASHING ---
+# Hashing runs on a bounded thread pool (api/hashing.py) so a login spike can't take every core.
+# Half the cores by default, leaving the rest for requests that are already signed in
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 1) // 2)))
+# Calls allowed to wait for a free hashing thread before new logins get a 503
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 64))
+# PBKDF2 cost for this deployment, unset means Django's default
+PASSWORD_HASH_ITERATIONS = int(os.environ['PASSWORD_HASH_ITERATIONS']) if os.environ.get('PASSWORD_HASH_ITERATIONS') else None
+
+PASSWORD_HASHERS = [
+    'api.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = ['api.backends.PooledModelBackend']
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
+    # Proxies in front of the app that append to X-Forwarded-For; the throttles key on the
+    # address the outermost one saw. 0 means REMOTE_ADDR, so clients can't pick their own limit.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
 }
 
+# request.user is built from token claims and kept per process for a short while;
+# a deactivated user can keep using an already-cached entry for at most this many seconds
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', 1024))
+# Shared cache holding deactivation markers, so every worker honours them
+AUTH_USER_CACHE_ALIAS = os.environ.get('AUTH_USER_CACHE_ALIAS', 'default')
+
 AUTH_USER_MODEL = 'api.User'
 
+# --- ACTIVITY HEARTBEAT ---
+# Token refreshes, POST /api/check-in/heartbeat/ and (with HEARTBEAT_ON_REQUEST) every authenticated
+# request count as a check-in. They're buffered per worker and written in bulk, see api/heartbeat.py.
+HEARTBEAT_ENABLED = os.environ.get('HEARTBEAT_ENABLED', 'True') == 'True'
+# Off by default: any client holding a token (a sync job, a stolen token) would keep
+# the dead-man switch from ever firing. Only deliberate check-ins count unless enabled.
+HEARTBEAT_ON_REQUEST = os.environ.get('HEARTBEAT_ON_REQUEST', 'False') == 'True'
+# Seconds between bulk writes
+HEARTBEAT_FLUSH_INTERVAL = float(os.environ.get('HEARTBEAT_FLUSH_INTERVAL', 30))
+# A user written this recently isn't buffered again
+HEARTBEAT_RESOLUTION = int(os.environ.get('HEARTBEAT_RESOLUTION', 300))
+# Users kept in memory per worker; a full buffer is written straight away
+HEARTBEAT_MAX_USERS = int(os.environ.get('HEARTBEAT_MAX_USERS', 10000))
+
+# What the existing migrations were created with
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+# --- ENCRYPTED PAYLOAD STORAGE ---
+# 'text' keeps ciphertext as base64 (legacy), 'binary' stores the raw bytes (~25% smaller)
+CIPHERTEXT_STORAGE = os.environ.get('CIPHERTEXT_STORAGE', 'text')
+# Largest vault accepted through the streaming upload endpoint, in decoded bytes
+VAULT_UPLOAD_MAX_BYTES = int(os.environ.get('VAULT_UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -113,11 +259,28 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:5173",
     
     # Add your LIVE frontend URL here once you deploy it!
-    "https://endura-phi.vercel.app/", 
+    "https://endura-phi.vercel.app",
 ]
+
+# Vault saves send back the ETag they were based on (If-Match, If-None-Match: *),
+# resumable document uploads send and read back their position
+CORS_ALLOW_HEADERS = (*default_headers, 'if-match', 'if-none-match', 'upload-offset')
+CORS_EXPOSE_HEADERS = ['ETag', 'Upload-Offset', 'Upload-Length', 'Location']
 # --- STATIC & MEDIA FILES ---
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # CRITICAL FOR RENDER BUILD
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Who sends verification documents once the admin has checked permissions: '' streams them from
+# Python (with Range support), 'x-accel-redirect' hands the transfer to nginx, 'x-sendfile' to
+# Apache or lighttpd (mod_xsendfile). See api/documents.py.
+DOCUMENT_SENDFILE = os.environ.get('DOCUMENT_SENDFILE', '')
+# The nginx `internal` location that maps onto MEDIA_ROOT, for x-accel-redirect
+DOCUMENT_ACCEL_PREFIX = os.environ.get('DOCUMENT_ACCEL_PREFIX', '/protected-media/')
+
+# --- EXECUTOR DOCUMENT UPLOADS ---
+DOCUMENT_UPLOAD_MAX_BYTES = int(os.environ.get('DOCUMENT_UPLOAD_MAX_BYTES', 25 * 1024 * 1024))
+# Unfinished uploads live here, outside MEDIA_ROOT so they're never served.
+# Keep it on the same filesystem as MEDIA_ROOT so finished files are moved, not copied.
+DOCUMENT_UPLOAD_TEMP_DIR = os.environ.get('DOCUMENT_UPLOAD_TEMP_DIR', os.path.join(BASE_DIR, 'uploads_partial'))